@@ -0,0 +1,142 @@
+'''
+* Adaptive Replacement Cache (Megiddo and Modha, FAST 2003).
+* Resident pages are split between T1 (seen once recently) and T2 (seen at
+* least twice). Ghost lists B1 and B2 remember the pages recently evicted
+* from each, without holding any frame. A fault on a ghost page shifts the
+* target size p of T1 towards the list that would have kept it, which lets
+* ARC resist scans that would flush an LRU cache.
+*
+* All four lists are OrderedDicts (least recently used first), so every
+* access is O(1). Only the eviction of a resident page costs a disk write.
+*
+'''
+from mmu import MMU
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
+from collections import OrderedDict
+
+class ArcMMU(MMU):
+    __slots__ = ('frames', 'target', 't1', 't2', 'b1', 'b2', 'dirty', 'dirty_pages', 'used',
+                 'disk_reads', 'disk_writes', 'page_faults', 'tracer')
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.target = 0  # Target size p of T1
+        self.t1 = OrderedDict()  # Resident pages seen once, page number -> frame index
+        self.t2 = OrderedDict()  # Resident pages seen at least twice, page number -> frame index
+        self.b1 = OrderedDict()  # Ghosts of pages evicted from T1
+        self.b2 = OrderedDict()  # Ghosts of pages evicted from T2
+        self.dirty = bytearray(frames)  # Modified bit of each frame
+        self.dirty_pages = 0  # Number of frames whose modified bit is set
+        self.used = 0  # Number of frames holding a page
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.tracer = None
+
+    def read_memory(self, page_number):
+        self._access(page_number, 0)
+
+    def write_memory(self, page_number):
+        self._access(page_number, 1)
+
+    def _access(self, page_number, write):
+        if page_number in self.t1:
+            # Second use, promote to T2
+            frame_index = self.t1.pop(page_number)
+            self.t2[page_number] = frame_index
+        elif page_number in self.t2:
+            frame_index = self.t2[page_number]
+            self.t2.move_to_end(page_number)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=write)
+            return
+
+        if write and not self.dirty[frame_index]:
+            self.dirty[frame_index] = 1
+            self.dirty_pages += 1
+        if self.tracer is not None:
+            self.tracer.record(HIT, page_number, frame_index)
+
+    def _evict(self, from_t1):
+        # Move the LRU page of T1 or T2 to its ghost list and free its frame
+        if from_t1:
+            replaced_page, frame_index = self.t1.popitem(last=False)
+            self.b1[replaced_page] = None
+        else:
+            replaced_page, frame_index = self.t2.popitem(last=False)
+            self.b2[replaced_page] = None
+
+        # If the replaced page was written to, we need to increment disk writes
+        if self.dirty[frame_index]:
+            self.disk_writes += 1
+
+        if self.tracer is not None:
+            self.tracer.record(EVICT, replaced_page, frame_index)
+            if self.dirty[frame_index]:
+                self.tracer.record(WRITEBACK, replaced_page, frame_index)
+        return frame_index
+
+    def _replace(self, in_b2):
+        t1_size = len(self.t1)
+        return self._evict(t1_size > 0 and (t1_size > self.target or (in_b2 and t1_size == self.target)))
+
+    def _handle_page_fault(self, page_number, dirty):
+        frames = self.frames
+        if page_number in self.b1:
+            # Recently evicted from T1: T1 should have been larger
+            self.target = min(frames, self.target + max(len(self.b2) // len(self.b1), 1))
+            frame_index = self._replace(False)
+            del self.b1[page_number]
+            self.t2[page_number] = frame_index
+        elif page_number in self.b2:
+            # Recently evicted from T2: T2 should have been larger
+            self.target = max(0, self.target - max(len(self.b1) // len(self.b2), 1))
+            frame_index = self._replace(True)
+            del self.b2[page_number]
+            self.t2[page_number] = frame_index
+        else:
+            l1 = len(self.t1) + len(self.b1)
+            total = l1 + len(self.t2) + len(self.b2)
+            if l1 == frames:
+                if len(self.t1) < frames:
+                    self.b1.popitem(last=False)
+                    frame_index = self._replace(False)
+                else:
+                    # B1 is empty, drop the LRU page of T1 without a ghost
+                    frame_index = self._evict(True)
+                    self.b1.popitem(last=False)
+            elif total >= frames:
+                if total >= 2 * frames:
+                    self.b2.popitem(last=False)
+                if len(self.t1) + len(self.t2) >= frames:
+                    frame_index = self._replace(False)
+                else:
+                    frame_index = self.used
+                    self.used += 1
+            else:
+                # There is still space in memory
+                frame_index = self.used
+                self.used += 1
+            self.t1[page_number] = frame_index
+
+        self.dirty_pages += dirty - self.dirty[frame_index]
+        self.dirty[frame_index] = dirty
+
+        # Increment disk reads as we load the new page into memory
+        self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+    def get_resident_dirty_pages(self):
+        return self.dirty_pages
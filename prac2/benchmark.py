@@ -0,0 +1,161 @@
+'''
+* Benchmark suite for the MMUs on synthetic workloads (see workloads.py).
+* Every workload is generated once into the work directory, then every
+* replacement mode is run on it for each frame count. Each run reports
+* events/sec, ns/event and the peak RSS as JSON lines, so results can be
+* compared between commits.
+*
+* With --save-baseline the results are stored as a baseline; with
+* --baseline they are compared against one, and the exit status is 1 if
+* any run's events/sec dropped by more than the tolerance.
+* benchmark-baseline.jsonl is the baseline of the default settings. Timings
+* depend on the machine, so save a new one before comparing elsewhere.
+*
+* Usage: python benchmark.py [--events N] [--frames F ...] [--modes M ...]
+*                            [--baseline FILE] [--save-baseline FILE]
+'''
+from evaluate import ReplacementMMU, create_mmu, get_trace, trace_for
+from measurement import MemorySampler
+from workloads import VERSION, WORKLOADS, write_trace
+
+import argparse
+import json
+import os
+import sys
+from dataclasses import dataclass, asdict
+from time import thread_time_ns
+
+WORK_DIR = "bench-traces"
+DEFAULT_BASELINE = "benchmark-baseline.jsonl"  # Baseline of the default settings
+DEFAULT_FRAMES = [16, 256, 4096]
+DEFAULT_TOLERANCE = 0.10  # allowed drop in events/sec before a run counts as a regression
+
+
+@dataclass
+class BenchResult:
+    workload: str
+    mmu: str
+    frames: int
+    events: int
+    events_per_sec: float
+    ns_per_event: float
+    peak_rss_kb: int
+    peak_traced_kb: int = 0  # tracemalloc peak of a separate untimed run, 0 unless enabled
+
+    def key(self):
+        return (self.workload, self.mmu, self.frames)
+
+
+def workload_trace(workload, events, pages, write_ratio, seed, work_dir=WORK_DIR):
+    '''Path of the generated trace, written on first use.'''
+    # The generator version is in the name, so traces of older generators are not reused
+    path = os.path.join(work_dir, f"{workload}-v{VERSION}-{events}-{pages}-{write_ratio}-{seed}.trace")
+    if not os.path.exists(path):
+        os.makedirs(work_dir, exist_ok=True)
+        write_trace(path + ".tmp", workload, events, pages, write_ratio, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def run_mmu(mode, frames, filename):
+    trace = trace_for([mode], filename)
+    mmu = create_mmu(mode, frames, filename, page_map=trace.page_map)
+    for pages, writes in trace.chunks():
+        mmu.access_batch(pages, writes)
+
+
+def bench(workload, mode, frames, filename, repeat=3, tracemalloc_peak=False):
+    '''Best of repeat runs, so scheduling noise only makes a run look slower.'''
+    events = len(get_trace(filename))
+    trace_for([mode], filename)  # Renumber the pages outside the timing
+    if mode is ReplacementMMU.opt:
+        create_mmu(mode, frames, filename)  # Build the next use index outside the timing
+
+    best = None
+    with MemorySampler() as memory:
+        for _ in range(repeat):
+            start = thread_time_ns()
+            run_mmu(mode, frames, filename)
+            elapsed = thread_time_ns() - start
+            best = elapsed if best is None else min(best, elapsed)
+    best = max(best, 1)
+
+    result = BenchResult(workload, mode.name, frames, events, events / (best / 10**9), best / events,
+                         memory.peak_rss_kb)
+    if tracemalloc_peak:
+        with MemorySampler(0, trace_allocations=True) as traced:
+            run_mmu(mode, frames, filename)
+        result.peak_traced_kb = traced.peak_traced_kb
+    return result
+
+
+def load_baseline(path):
+    with open(path) as infile:
+        return {result.key(): result for result in (BenchResult(**json.loads(line)) for line in infile if line.strip())}
+
+
+def save_results(path, results):
+    with open(path + ".tmp", "w") as outfile:
+        for result in results:
+            outfile.write(json.dumps(asdict(result)) + "\n")
+    os.replace(path + ".tmp", path)
+
+
+def regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    '''(result, baseline result) for every run slower than the baseline allows.'''
+    slower = []
+    for result in results:
+        previous = baseline.get(result.key())
+        if previous is not None and result.events_per_sec < previous.events_per_sec * (1 - tolerance):
+            slower.append((result, previous))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every MMU on synthetic workloads")
+    parser.add_argument("--events", type=int, default=200_000, help="events per workload (default: 200000)")
+    parser.add_argument("--pages", type=int, default=8192, help="distinct pages per workload (default: 8192)")
+    parser.add_argument("--write-ratio", type=float, default=0.3, help="fraction of writes (default: 0.3)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--modes", nargs="+", choices=[x.name for x in ReplacementMMU], default=[x.name for x in ReplacementMMU])
+    parser.add_argument("--frames", type=int, nargs="+", default=DEFAULT_FRAMES)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration, the fastest counts (default: 3)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record the tracemalloc peak in an extra run")
+    parser.add_argument("--work-dir", default=WORK_DIR, help=f"where generated traces are kept (default: {WORK_DIR})")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--baseline", help=f"compare against this results file, exit 1 on a regression "
+                                           f"(the default settings have {DEFAULT_BASELINE})")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"allowed drop in events/sec (default: {DEFAULT_TOLERANCE})")
+    parser.add_argument("--save-baseline", help="write the results to this file as the new baseline")
+    args = parser.parse_args()
+
+    results = []
+    for workload in args.workloads:
+        filename = workload_trace(workload, args.events, args.pages, args.write_ratio, args.seed, args.work_dir)
+        for mode in [ReplacementMMU[x] for x in args.modes]:
+            for frames in args.frames:
+                result = bench(workload, mode, frames, filename, args.repeat, args.tracemalloc)
+                print(json.dumps(asdict(result)), flush=True)
+                results.append(result)
+
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            save_results(path, results)
+
+    if args.baseline is not None:
+        try:
+            baseline = load_baseline(args.baseline)
+        except (OSError, ValueError, TypeError) as err:
+            print(f"Baseline '{args.baseline}' could not be read: {err}", file=sys.stderr)
+            sys.exit(2)
+        slower = regressions(results, baseline, args.tolerance)
+        for (result, previous) in slower:
+            print(f"Regression: {result.workload} {result.mmu} {result.frames} frames: "
+                  f"{result.events_per_sec:.0f} events/sec, baseline {previous.events_per_sec:.0f}", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
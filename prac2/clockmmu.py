@@ -1,91 +1,138 @@
 from mmu import MMU
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
+from array import array
 
 class ClockMMU(MMU):
+    __slots__ = ('frames', 'frame_pages', 'use_bits', 'dirty_bits', 'dirty_pages', 'clock_hand',
+                 'used', 'page_table', 'disk_reads', 'disk_writes', 'page_faults',
+                 'tracer')
+
     def __init__(self, frames):
         self.frames = frames
-        self.memory = []  # Represents frames in memory
-        self.use_bits = []  # Represents use bits for each page in memory
-        self.dirty_bits = []  # Tracks whether each page in memory is dirty
+        self.frame_pages = array('q', [-1]) * frames  # Page held by each frame, -1 if free
+        self.use_bits = bytearray(frames)  # Use bit of each frame
+        self.dirty_bits = bytearray(frames)  # Tracks whether the page in each frame is dirty
+        self.dirty_pages = 0  # Number of frames whose modified bit is set
         self.clock_hand = 0  # Points to the current position of the clock hand
+        self.used = 0  # Number of frames holding a page
         self.page_table = {}  # Maps page number to frame index in memory
         self.disk_reads = 0
         self.disk_writes = 0
         self.page_faults = 0
-        self.debug_mode = False
-
-    def set_debug(self):
-        self.debug_mode = True
-
-    def reset_debug(self):
-        self.debug_mode = False
+        self.tracer = None
 
     def read_memory(self, page_number):
-        if page_number in self.page_table:
+        frame_index = self.page_table.get(page_number)
+        if frame_index is not None:
             # Page is already in memory, set use bit to 1
-            frame_index = self.page_table[page_number]
             self.use_bits[frame_index] = 1
-            if self.debug_mode:
-                print(f"Page {page_number} read from memory.")
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
         else:
             # Page fault occurs
             self.page_faults += 1
             self._handle_page_fault(page_number, dirty=False)
 
     def write_memory(self, page_number):
-        if page_number in self.page_table:
+        frame_index = self.page_table.get(page_number)
+        if frame_index is not None:
             # Page is already in memory, set use bit to 1 and mark as dirty
-            frame_index = self.page_table[page_number]
             self.use_bits[frame_index] = 1
-            self.dirty_bits[frame_index] = True  # Mark page as dirty
-            if self.debug_mode:
-                print(f"Page {page_number} written to memory.")
+            if not self.dirty_bits[frame_index]:
+                self.dirty_bits[frame_index] = 1  # Mark page as dirty
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
         else:
             # Page fault occurs
             self.page_faults += 1
             self._handle_page_fault(page_number, dirty=True)
 
+    def access_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # Report every event to the tracer
+            return MMU.access_batch(self, pages, is_write)
+
+        page_table = self.page_table
+        use_bits = self.use_bits
+        dirty_bits = self.dirty_bits
+        last_page = None
+        for page_number, write in zip(pages, is_write):
+            if page_number == last_page:
+                # Repeated hit, the use bit is already set
+                if write and not dirty_bits[page_table[page_number]]:
+                    dirty_bits[page_table[page_number]] = 1
+                    self.dirty_pages += 1
+            elif page_number in page_table:
+                frame_index = page_table[page_number]
+                use_bits[frame_index] = 1
+                if write and not dirty_bits[frame_index]:
+                    dirty_bits[frame_index] = 1
+                    self.dirty_pages += 1
+            else:
+                self.page_faults += 1
+                self._handle_page_fault(page_number, dirty=write)
+            last_page = page_number
+
+    def _find_victim(self):
+        # Advance the clock hand to the next frame whose use bit is 0, clearing
+        # the use bits it passes. The scans and clears run over the bytearray
+        # in C, and each cleared bit was paid for by the access that set it.
+        hand = self.clock_hand
+        use_bits = self.use_bits
+        victim = use_bits.find(0, hand)
+        if victim >= 0:
+            use_bits[hand:victim] = bytes(victim - hand)
+            return victim
+
+        # Wrap around
+        use_bits[hand:] = bytes(self.frames - hand)
+        victim = use_bits.find(0, 0, hand)
+        if victim < 0:
+            # Every use bit was set, a full turn brings the hand back
+            victim = hand
+        use_bits[:victim] = bytes(victim)
+        return victim
+
     def _handle_page_fault(self, page_number, dirty):
-        if len(self.memory) < self.frames:
+        if self.used < self.frames:
             # There is still space in memory
-            self.memory.append(page_number)
-            self.use_bits.append(1)  # Set use bit to 1 for new page
-            self.dirty_bits.append(dirty)  # Mark as dirty if it was a write
-            self.page_table[page_number] = len(self.memory) - 1
+            frame_index = self.used
+            self.used += 1
         else:
             # No space, we need to find a page to replace using the Clock algorithm
-            while True:
-                if self.use_bits[self.clock_hand] == 0:
-                    # Found a page to replace
-                    replaced_page = self.memory[self.clock_hand]
-
-                    # Check if the replaced page is dirty, if so increment disk writes
-                    if self.dirty_bits[self.clock_hand]:
-                        self.disk_writes += 1
-                        if self.debug_mode:
-                            print(f"Writing dirty page {replaced_page} to disk.")
-
-                    # Replace the page in memory
-                    self.memory[self.clock_hand] = page_number
-                    self.page_table[page_number] = self.clock_hand
-                    del self.page_table[replaced_page]
-                    self.use_bits[self.clock_hand] = 1  # Set use bit to 1 for new page
-                    self.dirty_bits[self.clock_hand] = dirty  # Mark as dirty if it's a write
-
-                    if self.debug_mode:
-                        print(f"Page fault: loaded page {page_number} into frame {self.clock_hand}, replaced page {replaced_page}")
-                    
-                    # Move clock hand forward
-                    self.clock_hand = (self.clock_hand + 1) % self.frames
-                    break
-                else:
-                    # Clear the use bit and move the clock hand
-                    self.use_bits[self.clock_hand] = 0
-                    self.clock_hand = (self.clock_hand + 1) % self.frames
+            frame_index = self._find_victim()
+            replaced_page = self.frame_pages[frame_index]
+
+            # Check if the replaced page is dirty, if so increment disk writes
+            if self.dirty_bits[frame_index]:
+                self.disk_writes += 1
+
+            del self.page_table[replaced_page]
+
+            if self.tracer is not None:
+                self.tracer.record(EVICT, replaced_page, frame_index)
+                if self.dirty_bits[frame_index]:
+                    self.tracer.record(WRITEBACK, replaced_page, frame_index)
+
+            # Move clock hand forward
+            self.clock_hand = (frame_index + 1) % self.frames
+
+        # Load the page into the frame
+        self.frame_pages[frame_index] = page_number
+        self.page_table[page_number] = frame_index
+        self.use_bits[frame_index] = 1  # Set use bit to 1 for new page
+        self.dirty_pages += dirty - self.dirty_bits[frame_index]
+        self.dirty_bits[frame_index] = dirty  # Mark as dirty if it's a write
 
         # Increment disk reads as we load the new page into memory
         self.disk_reads += 1
-        if self.debug_mode:
-            print(f"Reading page {page_number} from disk.")
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
+
+    def clean_frame(self, frame_index):
+        self.dirty_pages -= self.dirty_bits[frame_index]
+        self.dirty_bits[frame_index] = 0
 
     def get_total_disk_reads(self):
         return self.disk_reads
@@ -95,3 +142,101 @@ class ClockMMU(MMU):
 
     def get_total_page_faults(self):
         return self.page_faults
+
+    def get_resident_dirty_pages(self):
+        return self.dirty_pages
+
+
+class DenseClockMMU(ClockMMU):
+    '''ClockMMU for traces renumbered by tracefile.densify(): page ids index
+    a flat list of frames instead of hashing into the page table dict.
+    '''
+    __slots__ = ('page_map', 'frame_of')
+
+    def __init__(self, frames, page_map):
+        ClockMMU.__init__(self, frames)
+        self.page_table = None  # Replaced by frame_of
+        self.page_map = page_map  # Page number of each page id
+        self.frame_of = [-1] * len(page_map)  # Frame index of each page id, -1 if not resident
+
+    def read_memory(self, page_number):
+        frame_index = self.frame_of[page_number]
+        if frame_index >= 0:
+            # Page is already in memory, set use bit to 1
+            self.use_bits[frame_index] = 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=False)
+
+    def write_memory(self, page_number):
+        frame_index = self.frame_of[page_number]
+        if frame_index >= 0:
+            # Page is already in memory, set use bit to 1 and mark as dirty
+            self.use_bits[frame_index] = 1
+            if not self.dirty_bits[frame_index]:
+                self.dirty_bits[frame_index] = 1
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=True)
+
+    def access_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # Report every event to the tracer
+            return MMU.access_batch(self, pages, is_write)
+
+        frame_of = self.frame_of
+        use_bits = self.use_bits
+        dirty_bits = self.dirty_bits
+        for page_id, write in zip(pages, is_write):
+            frame_index = frame_of[page_id]
+            if frame_index >= 0:
+                use_bits[frame_index] = 1
+                if write and not dirty_bits[frame_index]:
+                    dirty_bits[frame_index] = 1
+                    self.dirty_pages += 1
+            else:
+                self.page_faults += 1
+                self._handle_page_fault(page_id, dirty=write)
+
+    def _handle_page_fault(self, page_number, dirty):
+        if self.used < self.frames:
+            # There is still space in memory
+            frame_index = self.used
+            self.used += 1
+        else:
+            # No space, we need to find a page to replace using the Clock algorithm
+            frame_index = self._find_victim()
+            replaced_page = self.frame_pages[frame_index]
+
+            # Check if the replaced page is dirty, if so increment disk writes
+            if self.dirty_bits[frame_index]:
+                self.disk_writes += 1
+
+            self.frame_of[replaced_page] = -1
+
+            if self.tracer is not None:
+                self.tracer.record(EVICT, replaced_page, frame_index)
+                if self.dirty_bits[frame_index]:
+                    self.tracer.record(WRITEBACK, replaced_page, frame_index)
+
+            # Move clock hand forward
+            self.clock_hand = (frame_index + 1) % self.frames
+
+        # Load the page into the frame
+        self.frame_pages[frame_index] = page_number
+        self.frame_of[page_number] = frame_index
+        self.use_bits[frame_index] = 1  # Set use bit to 1 for new page
+        self.dirty_pages += dirty - self.dirty_bits[frame_index]
+        self.dirty_bits[frame_index] = dirty  # Mark as dirty if it's a write
+
+        # Increment disk reads as we load the new page into memory
+        self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
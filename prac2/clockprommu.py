@@ -0,0 +1,293 @@
+'''
+* CLOCK-Pro replacement (Jiang, Chen and Zhang, USENIX ATC 2005).
+* Pages sit on one circular list and are hot, cold or test (a cold page that
+* has been evicted but whose number is kept for a test period). A cold page
+* reused during its test period shows a short reuse distance and becomes
+* hot; hot pages are only demoted when they go a whole revolution without
+* use. The number of resident cold pages adapts: it grows when a test page
+* is reused and shrinks when a test period expires unused.
+*
+* Three hands move around the list:
+*   HAND_cold  evicts unused cold pages and promotes used ones,
+*   HAND_hot   demotes unused hot pages to cold,
+*   HAND_test  ends the test period of the oldest test pages.
+* A hit only sets the reference bit, and every hand step either retires a
+* list entry or clears a bit set by a hit, so the work is O(1) amortised.
+*
+'''
+from mmu import MMU
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
+
+HOT = 0
+COLD = 1
+TEST = 2
+
+
+class _Entry:
+    __slots__ = ('page_number', 'frame_index', 'kind', 'in_test', 'referenced', 'prev', 'next')
+
+    def __init__(self, page_number, frame_index, kind):
+        self.page_number = page_number
+        self.frame_index = frame_index
+        self.kind = kind
+        self.in_test = kind == COLD  # New cold pages start a test period
+        self.referenced = False
+        self.prev = self
+        self.next = self
+
+
+class ClockProMMU(MMU):
+    __slots__ = ('frames', 'page_table', 'cold_target', 'hot_count', 'cold_count',
+                 'test_count', 'hand_hot', 'hand_cold', 'hand_test', 'free_frames',
+                 'dirty', 'dirty_pages', 'used', 'disk_reads', 'disk_writes', 'page_faults',
+                 'tracer')
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.page_table = {}  # Maps page number to its list entry (resident or test)
+        self.cold_target = frames  # Adaptive target for resident cold pages
+        self.hot_count = 0
+        self.cold_count = 0
+        self.test_count = 0  # Non-resident pages in their test period
+        self.hand_hot = None
+        self.hand_cold = None
+        self.hand_test = None
+        self.free_frames = []  # Frames released by evictions
+        self.dirty = bytearray(frames)  # Modified bit of each frame
+        self.dirty_pages = 0  # Number of frames whose modified bit is set
+        self.used = 0  # Number of frames holding a page
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.tracer = None
+
+    def read_memory(self, page_number):
+        self._access(page_number, 0)
+
+    def write_memory(self, page_number):
+        self._access(page_number, 1)
+
+    def _access(self, page_number, write):
+        entry = self.page_table.get(page_number)
+        if entry is not None and entry.kind != TEST:
+            entry.referenced = True
+            if write and not self.dirty[entry.frame_index]:
+                self.dirty[entry.frame_index] = 1
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, entry.frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=write)
+
+    def _link_head(self, entry):
+        # The list head is just behind HAND_hot, the last place the hands reach
+        if self.hand_hot is None:
+            entry.prev = entry.next = entry
+            self.hand_hot = self.hand_cold = self.hand_test = entry
+            return
+        tail = self.hand_hot.prev
+        entry.prev = tail
+        entry.next = self.hand_hot
+        tail.next = entry
+        self.hand_hot.prev = entry
+
+    def _unlink(self, entry):
+        # Hands on the entry move on to the next one
+        successor = entry.next if entry.next is not entry else None
+        if self.hand_hot is entry:
+            self.hand_hot = successor
+        if self.hand_cold is entry:
+            self.hand_cold = successor
+        if self.hand_test is entry:
+            self.hand_test = successor
+        entry.prev.next = entry.next
+        entry.next.prev = entry.prev
+
+    def _remove(self, entry):
+        self._unlink(entry)
+        del self.page_table[entry.page_number]
+
+    def _end_test(self, entry):
+        # A test period ran out without reuse: fewer cold pages are needed
+        if self.cold_target > 1:
+            self.cold_target -= 1
+        if entry.kind == TEST:
+            self._remove(entry)
+            self.test_count -= 1
+            return True
+        entry.in_test = False
+        return False
+
+    def _run_hand_cold(self):
+        # Move HAND_cold until a cold page has been evicted
+        while True:
+            entry = self.hand_cold
+            if entry.kind != COLD:
+                self.hand_cold = entry.next
+            elif entry.referenced:
+                entry.referenced = False
+                if entry.in_test:
+                    # Reused during its test period, promote
+                    entry.kind = HOT
+                    entry.in_test = False
+                    self.cold_count -= 1
+                    self.hot_count += 1
+                    self.hand_cold = entry.next
+                    self._balance_hot()
+                else:
+                    # Give it a new test period at the list head
+                    entry.in_test = True
+                    self._unlink(entry)
+                    self._link_head(entry)
+            else:
+                self.cold_count -= 1
+                self._release(entry)
+                if entry.in_test:
+                    # Keep its number until the test period ends
+                    entry.kind = TEST
+                    self.test_count += 1
+                    self.hand_cold = entry.next
+                    while self.test_count > self.frames:
+                        self._run_hand_test()
+                else:
+                    self._remove(entry)
+                return
+
+    def _run_hand_hot(self):
+        # Move HAND_hot until a hot page has been demoted, ending the
+        # test periods it passes
+        while True:
+            entry = self.hand_hot
+            if entry.kind == HOT:
+                self.hand_hot = entry.next
+                if entry.referenced:
+                    entry.referenced = False
+                else:
+                    entry.kind = COLD
+                    self.hot_count -= 1
+                    self.cold_count += 1
+                    return
+            elif entry.in_test:
+                if not self._end_test(entry):
+                    self.hand_hot = entry.next
+            else:
+                self.hand_hot = entry.next
+
+    def _run_hand_test(self):
+        # Move HAND_test until a non-resident test page has been removed
+        while True:
+            entry = self.hand_test
+            if entry.kind != HOT and entry.in_test and self._end_test(entry):
+                return
+            self.hand_test = entry.next
+
+    def _balance_hot(self):
+        while self.hot_count > self.frames - self.cold_target:
+            self._run_hand_hot()
+
+    def _release(self, entry):
+        frame_index = entry.frame_index
+        entry.frame_index = -1
+
+        # If the replaced page was written to, we need to increment disk writes
+        if self.dirty[frame_index]:
+            self.disk_writes += 1
+
+        if self.tracer is not None:
+            self.tracer.record(EVICT, entry.page_number, frame_index)
+            if self.dirty[frame_index]:
+                self.tracer.record(WRITEBACK, entry.page_number, frame_index)
+        self.dirty_pages -= self.dirty[frame_index]
+        self.dirty[frame_index] = 0  # Free frames hold no modified page
+        self.free_frames.append(frame_index)
+
+    def _handle_page_fault(self, page_number, dirty):
+        test_entry = self.page_table.get(page_number)
+        if test_entry is not None:
+            # Reused during its test period: more cold pages are needed
+            if self.cold_target < self.frames:
+                self.cold_target += 1
+            self.test_count -= 1
+            self._remove(test_entry)
+            while self.test_count > self.frames:
+                self._run_hand_test()
+
+        # Free a frame
+        while self.hot_count + self.cold_count >= self.frames:
+            self._run_hand_cold()
+        if self.free_frames:
+            frame_index = self.free_frames.pop()
+        else:
+            frame_index = self.used
+            self.used += 1
+
+        entry = _Entry(page_number, frame_index, HOT if test_entry is not None else COLD)
+        self._link_head(entry)
+        self.page_table[page_number] = entry
+        if test_entry is not None:
+            self.hot_count += 1
+            self._balance_hot()
+        else:
+            self.cold_count += 1
+        self.dirty_pages += dirty - self.dirty[frame_index]
+        self.dirty[frame_index] = dirty
+
+        # Increment disk reads as we load the new page into memory
+        self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
+
+    def _get_state(self):
+        # The circular list is saved as flat fields in list order from
+        # HAND_hot, since pickling the linked entries would recurse along it
+        state = MMU._get_state(self)
+        del state['page_table'], state['hand_hot'], state['hand_cold'], state['hand_test']
+        entries = []
+        hands = [-1, -1]
+        if self.hand_hot is not None:
+            entry = self.hand_hot
+            while True:
+                if entry is self.hand_cold:
+                    hands[0] = len(entries)
+                if entry is self.hand_test:
+                    hands[1] = len(entries)
+                entries.append((entry.page_number, entry.frame_index, entry.kind, entry.in_test, entry.referenced))
+                entry = entry.next
+                if entry is self.hand_hot:
+                    break
+        state['entries'] = entries
+        state['hands'] = hands
+        return state
+
+    def _set_state(self, state):
+        state = dict(state)
+        entries = state.pop('entries')
+        (cold_index, test_index) = state.pop('hands')
+        MMU._set_state(self, state)
+        self.page_table = {}
+        self.hand_hot = self.hand_cold = self.hand_test = None
+        linked = []
+        for (page_number, frame_index, kind, in_test, referenced) in entries:
+            entry = _Entry(page_number, frame_index, kind)
+            entry.in_test = in_test
+            entry.referenced = referenced
+            self._link_head(entry)
+            self.page_table[page_number] = entry
+            linked.append(entry)
+        if linked:
+            self.hand_cold = linked[cold_index]
+            self.hand_test = linked[test_index]
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+    def get_resident_dirty_pages(self):
+        return self.dirty_pages
@@ -0,0 +1,79 @@
+'''
+* Compaction of runs of back-to-back accesses to the same page.
+* A run becomes one access that is a write if any access of the run was,
+* and remembers how many events it stands for, so the exact event count is
+* still known.
+*
+* Why this is lossless for the policies in LOSSLESS_MMUS: take two
+* consecutive accesses to page p. After the first, p is resident whether it
+* hit or faulted, so the second is a hit. No hit faults, evicts, reads or
+* writes the disk, so every counter is the same without it, and what is
+* left is its effect on the policy state:
+*   lru     moves p to the most recently used end, where it already is.
+*   clock   sets the use bit of p, already set by the first access: loads
+*           and hits set it, and only a fault moves the hand that clears it.
+*   rand    does nothing (the victim generator is only drawn on faults).
+*   2q      moves p to the end of Am, where it already is, or leaves it in
+*           place in A1in.
+* In all four the only other effect is the modified bit: setting it on the
+* first access (a fault loads with it, a hit ORs it) or on a later one ends
+* in the same frame state, which is what the merged write flag gives.
+*
+* The other policies see the difference: ARC promotes a page from T1 to T2
+* on its second access, LFU counts every access, CLOCK-Pro sets the
+* reference bit that a fault leaves clear, and OPT's next use index has one
+* entry per event. Tracers, warm-up boundaries and time series windows
+* count events too, so runs that use them are not compacted.
+*
+'''
+from clockmmu import ClockMMU
+from lrummu import LruMMU
+from randmmu import RandMMU
+from twoqmmu import TwoQMMU
+
+from array import array
+from dataclasses import replace
+
+LOSSLESS_MMUS = (LruMMU, ClockMMU, RandMMU, TwoQMMU)
+
+
+def is_lossless(mmu_class):
+    '''True if compacting the trace leaves every counter of mmu_class unchanged.'''
+    return issubclass(mmu_class, LOSSLESS_MMUS)
+
+
+def compact_runs(pages, writes):
+    '''Collapse runs of equal pages. Returns (pages, writes, counts), where
+    writes[i] is 1 if any access of run i was a write and counts[i] is the
+    number of events in run i.
+    '''
+    run_pages = array(pages.typecode) if isinstance(pages, array) else []
+    run_writes = bytearray()
+    counts = array('I')
+    last_page = None
+    count = 0
+    for page_number, write in zip(pages, writes):
+        if page_number == last_page:
+            count += 1
+            if write:
+                run_writes[-1] = 1
+        else:
+            if count:
+                counts.append(count)
+            run_pages.append(page_number)
+            run_writes.append(write)
+            last_page = page_number
+            count = 1
+    if count:
+        counts.append(count)
+    return run_pages, run_writes, counts
+
+
+def compact(trace):
+    '''Return the trace with its runs collapsed; event_count() still gives
+    the number of events of the original trace.
+    '''
+    if trace.counts is not None:
+        return trace
+    (pages, writes, counts) = compact_runs(trace.pages, trace.writes)
+    return replace(trace, pages=pages, writes=writes, counts=counts)
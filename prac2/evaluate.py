@@ -1,26 +1,57 @@
 from mmu import MMU
-from clockmmu import ClockMMU
-from lrummu import LruMMU
-from randmmu import RandMMU
-from measurement import thread_timer
+from clockmmu import ClockMMU, DenseClockMMU
+from lrummu import LruMMU, DenseLruMMU
+from randmmu import RandMMU, DenseRandMMU, DEFAULT_SEED
+from optmmu import OptMMU, next_use_index
+from arcmmu import ArcMMU
+from twoqmmu import TwoQMMU
+from clockprommu import ClockProMMU
+from lfummu import LfuMMU
+from measurement import thread_timer, PhaseTimer, MemorySampler
+from eventtrace import EventTracer
+from timeseries import WindowRecorder
+from prefetch import Readahead, PREFETCHERS
+from writeback import PageCleaner, DEFAULT_HIGH_WATERMARK, DEFAULT_LOW_WATERMARK
+from tracefile import load_trace, densify, shift_pages, TraceFormatError
+from stackdist import lru_stack_distances
+from lockstep import simulate_lockstep
+from resultcache import ResultCache, DEFAULT_CACHE_DIR
+from compaction import compact, is_lossless
+import compaction
+import lockstep
+import stackdist
+import tracefile
 
+import argparse
+import importlib
 import os
-import psutil  # To track memory usage
+import statistics
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict, field
+from contextlib import contextmanager
 from functools import cache
 
 mmu_labels = [
     (ClockMMU, "clock"),
     (LruMMU, "lru"),
     (RandMMU, "rand"),
+    (OptMMU, "opt"),
+    (ArcMMU, "arc"),
+    (TwoQMMU, "2q"),
+    (ClockProMMU, "clockpro"),
+    (LfuMMU, "lfu"),
     (MMU, "undefined")
 ]
 
-@cache
 def name_of_mmu(mmu):
+    # Cache on the class, so MMU instances (and their frame tables) are not kept alive
+    return name_of_mmu_type(type(mmu))
+
+@cache
+def name_of_mmu_type(mmu_class):
     for (mmu_type, label) in mmu_labels:
-        if isinstance(mmu, mmu_type):
+        if issubclass(mmu_class, mmu_type):
             return label
     return None
 
@@ -34,6 +65,11 @@ class ReplacementMMU(MMU, Enum):
     rand = RandMMU
     lru = LruMMU
     clock = ClockMMU
+    opt = OptMMU
+    arc = ArcMMU
+    twoq = TwoQMMU
+    clockpro = ClockProMMU
+    lfu = LfuMMU
 
 class DebugMode(int, Enum):
     DEBUG = True
@@ -41,6 +77,13 @@ class DebugMode(int, Enum):
 
 PAGE_OFFSET = 12  # page is 2^12 = 4KB
 
+# Array-based MMUs for traces renumbered to dense page ids
+DENSE_MMUS = {
+    ReplacementMMU.lru: DenseLruMMU,
+    ReplacementMMU.clock: DenseClockMMU,
+    ReplacementMMU.rand: DenseRandMMU,
+}
+
 @dataclass
 class OutputData:
     filename: str
@@ -50,7 +93,14 @@ class OutputData:
     reads: int
     writes: int
     fault_rate: float
-    peak_memory: int
+    peak_memory: int  # Peak RSS in KB
+    peak_traced: int = 0  # Peak tracemalloc size in KB, 0 unless enabled
+    parse_sec: float = 0.0
+    simulate_sec: float = 0.0
+    report_sec: float = 0.0
+    seeds: int = 1  # Runs averaged into this row, one per seed
+    fault_rate_stdev: float = 0.0  # Spread of the fault rate over the seeds
+    page_size: int = 1 << PAGE_OFFSET  # Bytes per page
 
 @dataclass
 class SimulationParameters:
@@ -58,6 +108,9 @@ class SimulationParameters:
     frames: int
     replacement_mode: ReplacementMMU
     debug_mode: DebugMode
+    seed: int = DEFAULT_SEED  # Only used by the random policy
+    warmup: int = 0  # Events simulated before the counters start
+    page_offset: int = PAGE_OFFSET  # Pages are 2**page_offset bytes
 
 @dataclass
 class SimulationFactory:
@@ -65,97 +118,824 @@ class SimulationFactory:
     frames_range: list[int]
     replacement_modes: list[ReplacementMMU]
     debug_modes: list[DebugMode]
+    seeds: list[int] = field(default_factory=lambda: [DEFAULT_SEED])  # Seeds of the random policy
+    warmup: int = 0  # Events of each trace simulated before the counters start
+    page_offsets: list[int] = field(default_factory=lambda: [PAGE_OFFSET])  # Page sizes, as 2**page_offset bytes
 
     def enumerate(self):
         for file in self.trace_files:
-            for mmu in self.replacement_modes:
-                for frames in self.frames_range:
-                    for debug in self.debug_modes:
-                        yield SimulationParameters(
-                            file,
-                            frames,
-                            mmu,
-                            debug
-                        )
-
-def get_memory_usage():
-    return 42
-    """Get current memory usage of the process in KB."""
-    process = psutil.Process(os.getpid())
-    return process.memory_info().rss // 1024  # in KB
+            for page_offset in self.page_offsets:
+                for mmu in self.replacement_modes:
+                    for frames in self.frames_range:
+                        for debug in self.debug_modes:
+                            for seed in (self.seeds if mmu is ReplacementMMU.rand else [DEFAULT_SEED]):
+                                yield SimulationParameters(
+                                    file,
+                                    frames,
+                                    mmu,
+                                    debug,
+                                    seed,
+                                    self.warmup,
+                                    page_offset
+                                )
+
+@dataclass
+class LruStackTask:
+    trace_file: TraceFile
+    frames_range: list[int]
+    page_offset: int = PAGE_OFFSET
+
+@dataclass
+class LockstepTask:
+    trace_file: TraceFile
+    sims: list[SimulationParameters]
+
+@dataclass
+class PrefetchTask:
+    sim: SimulationParameters
+    prefetcher: str  # Key of prefetch.PREFETCHERS
+
+@dataclass
+class WritebackTask:
+    sim: SimulationParameters
+    high_watermark: float  # Dirty fraction of the frames that starts the page cleaner
+    low_watermark: float  # Dirty fraction the page cleaner stops at
+
+@dataclass
+class ForkTask:
+    trace_file: TraceFile  # Trace whose first events warm the MMUs up
+    sims: list[SimulationParameters]
+    tail_files: list[TraceFile]  # Traces whose remaining events each fork runs
+    page_offset: int = PAGE_OFFSET
+
+# Memory is sampled on a background thread instead of after every event.
+# Set by configure_instrumentation() in the main process and in pool workers.
+memory_interval = 0.05  # seconds between RSS samples, 0 to sample only at the start and end
+trace_allocations = False  # also record the tracemalloc peak (slows allocations)
+event_dir = None  # directory for binary event traces of every run, None to disable
+event_sample = 1  # record every Nth access
+event_evictions_only = False  # record only evictions and write-backs
+window_events = 0  # events per window of the per-run time series, 0 to disable
+window_dir = None  # directory for the time series of every run
+
+def configure_instrumentation(interval: float, tracemalloc_peak: bool,
+                              events: str = None, sample_every: int = 1, evictions_only: bool = False,
+                              window: int = 0, windows: str = None):
+    global memory_interval, trace_allocations, event_dir, event_sample, event_evictions_only
+    global window_events, window_dir
+    memory_interval = interval
+    trace_allocations = tracemalloc_peak
+    event_dir = events
+    event_sample = sample_every
+    event_evictions_only = evictions_only
+    window_events = window
+    window_dir = windows
+
+def instrumented_runs():
+    '''True if every run records events or a time series, and so needs its own MMU.'''
+    return event_dir is not None or window_events > 0
+
+def memory_sampler():
+    return MemorySampler(memory_interval, trace_allocations)
+
+class TraceLoadError(Exception):
+    '''A trace of the sweep is missing or badly formatted; the message names it.'''
+
+@contextmanager
+def loading_trace(filename):
+    '''Turn the errors of loading filename into a TraceLoadError, which
+    main() reports once, wherever the trace was loaded.'''
+    try:
+        yield
+    except FileNotFoundError:
+        raise TraceLoadError(f"Input '{filename}' could not be found") from None
+    except TraceFormatError as err:
+        raise TraceLoadError(f"Badly formatted file '{filename}'. Error on line {err.line_number}") from None
+
+def get_trace(filename, page_offset=PAGE_OFFSET):
+    '''Load a trace once per process, so later runs (and pool workers) reuse it.
+    Lines are only decoded into the smallest page size, PAGE_OFFSET; larger
+    pages are shifted from those page numbers.
+    '''
+    # The cached loader always gets both arguments, so a defaulted call
+    # shares its entry with an explicit one
+    return _cached_trace(filename, page_offset)
+
+@cache
+def _cached_trace(filename, page_offset):
+    if page_offset == PAGE_OFFSET:
+        return load_trace(filename, PAGE_OFFSET)
+    return shift_pages(_cached_trace(filename, PAGE_OFFSET), page_offset)
+
+@cache
+def get_prepared_trace(filename, dense, compacted, page_offset=PAGE_OFFSET):
+    '''The trace compacted and/or renumbered to dense page ids, built once per process.'''
+    trace = get_trace(filename, page_offset)
+    if compacted:
+        trace = compact(trace)
+    if dense:
+        trace = densify(trace)
+    return trace
+
+def trace_for(replacement_modes, filename, compacted=False, page_offset=PAGE_OFFSET):
+    '''The trace to simulate the modes on: dense if any of them has an
+    array-based MMU, and compacted if asked and lossless for all of them.
+    Renumbering is one to one and keeps the event order, so the other MMUs
+    give the same results on either. OPT breaks ties between pages by page
+    number, which renumbering would change, so it always gets page numbers.
+    '''
+    dense = ReplacementMMU.opt not in replacement_modes and any(mode in DENSE_MMUS for mode in replacement_modes)
+    compacted = compacted and all(is_lossless(mode.value) for mode in replacement_modes)
+    return get_prepared_trace(filename, dense, compacted, page_offset)
+
+@cache
+def get_next_use(filename, page_offset=PAGE_OFFSET):
+    '''Next use index of a trace for OptMMU, computed once per process.'''
+    return next_use_index(get_trace(filename, page_offset).pages)
+
+def run_name(sim: SimulationParameters):
+    '''Name of the per-run files of a simulation, unique within a sweep.'''
+    name = f"{sim.trace_file.value}-{sim.replacement_mode.name}-{sim.frames}"
+    if sim.page_offset != PAGE_OFFSET:
+        name += f"-{1 << sim.page_offset}"
+    if sim.replacement_mode is ReplacementMMU.rand:
+        name += f"-s{sim.seed}"
+    if sim.warmup:
+        name += f"-w{sim.warmup}"
+    return name
+
+def event_tracer(sim: SimulationParameters, page_map=None):
+    '''Tracer writing the events of a run to event_dir, or None when not recording.
+    page_map translates the page ids of a dense trace back to page numbers.
+    '''
+    if event_dir is None:
+        return None
+    path = os.path.join(event_dir, f"{run_name(sim)}.mevt")
+    return EventTracer(path, sample_every=event_sample, evictions_only=event_evictions_only, page_map=page_map)
+
+def window_file(sim: SimulationParameters):
+    '''File for the time series of a run, or None when not recording one.'''
+    if window_events <= 0:
+        return None
+    return open(os.path.join(window_dir, f"{run_name(sim)}.csv"), "w")
+
+def create_mmu(replacement_mode: ReplacementMMU, frames: int, filename: str, seed: int = DEFAULT_SEED,
+               page_map=None, page_offset: int = PAGE_OFFSET):
+    '''MMU for a run over the trace in filename. Give the page_map of a dense
+    trace to get the array-based MMU of modes that have one.
+    '''
+    if replacement_mode is ReplacementMMU.opt:
+        return OptMMU(frames, get_next_use(filename, page_offset))
+    if page_map is not None and replacement_mode in DENSE_MMUS:
+        dense_class = DENSE_MMUS[replacement_mode]
+        if replacement_mode is ReplacementMMU.rand:
+            return dense_class(frames, page_map, seed)
+        return dense_class(frames, page_map)
+    if replacement_mode is ReplacementMMU.rand:
+        return RandMMU(frames, seed)
+    return replacement_mode.value(frames)
+
+def counters(mmu: MMU):
+    return (mmu.get_total_page_faults(), mmu.get_total_disk_reads(), mmu.get_total_disk_writes())
+
+def post_warmup(mmu: MMU, warm: tuple, no_events: int):
+    '''(reads, writes, fault rate) of the events after the warm-up, whose counters were warm.'''
+    (faults, reads, writes) = (now - before for (now, before) in zip(counters(mmu), warm))
+    return reads, writes, faults / no_events if no_events else 0.0
+
+def result_key(sim: SimulationParameters):
+    '''Key of a simulation in the result dicts of the tasks.'''
+    return (sim.replacement_mode, sim.frames, sim.seed, sim.page_offset)
 
 @thread_timer
 def simulate(sim: SimulationParameters):
     filename = f"{sim.trace_file.value}.trace"
-    try:
-        with open(filename, 'r') as file:
-            # Read the trace file contents
-            trace_contents = file.readlines()
-    except FileNotFoundError:
-        print(f"Input '{filename}' could not be found")
-        return
-    
-    frames = sim.frames
-    mmu = sim.replacement_mode.value(frames)
-    no_events = 0
-    peak_memory = get_memory_usage()  # Initialize peak memory tracking
-
-    for trace_line in trace_contents:
-        trace_cmd = trace_line.strip().split(" ")
-        logical_address = int(trace_cmd[0], 16)
-        page_number = logical_address >> PAGE_OFFSET
-
-        # Process read or write
-        if trace_cmd[1] == "R":
-            mmu.read_memory(page_number)
-        elif trace_cmd[1] == "W":
-            mmu.write_memory(page_number)
+    phases = PhaseTimer()
+    with memory_sampler() as memory:
+        # Load the compiled trace, building it on first use
+        # Tracers, warm-up and time series count every event
+        with phases.phase("parse"), loading_trace(filename):
+            trace = trace_for([sim.replacement_mode], filename, not sim.warmup and not instrumented_runs(),
+                              sim.page_offset)
+
+        frames = sim.frames
+        with phases.phase("simulate"):
+            mmu = create_mmu(sim.replacement_mode, frames, filename, sim.seed, trace.page_map, sim.page_offset)
+            tracer = event_tracer(sim, trace.page_map)
+            if tracer is not None:
+                mmu.set_tracer(tracer)
+            # With a time series, the events go through the window recorder
+            windows = window_file(sim)
+            target = mmu
+            if windows is not None:
+                target = WindowRecorder(mmu, window_events, windows)
+                target.write_header()
+            for pages, writes in trace.chunks(last=sim.warmup):
+                target.access_batch(pages, writes)
+            warm = counters(mmu)
+            for pages, writes in trace.chunks(first=sim.warmup):
+                # Process a chunk of reads and writes
+                target.access_batch(pages, writes)
+            if tracer is not None:
+                tracer.close()
+            if windows is not None:
+                target.finish()
+                windows.close()
+
+    with phases.phase("report"):
+        no_events = max(trace.event_count() - sim.warmup, 0)
+        (reads, writes, fault_rate) = post_warmup(mmu, warm, no_events)
+
+        od = OutputData(
+            filename,
+            name_of_mmu(mmu),
+            frames,
+            no_events,
+            reads,
+            writes,
+            fault_rate,
+            memory.peak_rss_kb,
+            memory.peak_traced_kb,
+            page_size=1 << sim.page_offset
+        )
+        print(format_row(od), end='')
+
+    od.parse_sec = phases["parse"]
+    od.simulate_sec = phases["simulate"]
+    od.report_sec = phases["report"]
+    return od
+
+def format_row(od: OutputData):
+    return f"{od.filename:<14}|{od.mmu_name:<8}|{od.frames: 8d}|{od.events: 8d}|{od.reads: 7d} reads|{od.writes: 7d} writes|{od.fault_rate: 8.3%}|"
+
+@thread_timer
+def simulate_lru_stack(trace_file: TraceFile, frames_range: list[int], page_offset: int = PAGE_OFFSET):
+    '''Simulate LRU for every frame count with a single stack distance pass.
+    Returns a dict of result_key() -> OutputData, matching simulate() with LruMMU.
+    The phase times of the pass are shared evenly between the frame counts.
+    '''
+    filename = f"{trace_file.value}.trace"
+    phases = PhaseTimer()
+    with memory_sampler() as memory:
+        with phases.phase("parse"), loading_trace(filename):
+            trace = get_prepared_trace(filename, False, True, page_offset)
+
+        with phases.phase("simulate"):
+            profile = lru_stack_distances(trace.pages, trace.writes)
+
+    with phases.phase("report"):
+        no_events = trace.event_count()
+        results = {}
+        for frames in frames_range:
+            od = OutputData(
+                filename,
+                ReplacementMMU.lru.name,
+                frames,
+                no_events,
+                profile.get_total_disk_reads(frames),
+                profile.get_total_disk_writes(frames),
+                profile.get_total_page_faults(frames) / no_events,
+                memory.peak_rss_kb,
+                memory.peak_traced_kb,
+                page_size=1 << page_offset
+            )
+            print(format_row(od))
+            results[(ReplacementMMU.lru, frames, DEFAULT_SEED, page_offset)] = od
+
+    for od in results.values():
+        od.parse_sec = phases["parse"] / len(results)
+        od.simulate_sec = phases["simulate"] / len(results)
+        od.report_sec = phases["report"] / len(results)
+    return results
+
+def simulate_lockstep_group(trace_file: TraceFile, sims: list[SimulationParameters]):
+    '''Simulate several configurations of one trace over a single trace pass.
+    Returns a dict of result_key() -> (OutputData, time_sec),
+    where time_sec is the CPU time spent in that configuration's MMU.
+    Parse time is shared evenly between the configurations.
+    '''
+    filename = f"{trace_file.value}.trace"
+    # The sims of a group share the page size
+    page_offset = sims[0].page_offset
+    phases = PhaseTimer()
+    with memory_sampler() as memory:
+        with phases.phase("parse"), loading_trace(filename):
+            trace = trace_for([sim.replacement_mode for sim in sims], filename, not sims[0].warmup, page_offset)
+
+        # The sims of a sweep share the warm-up length
+        warmup = sims[0].warmup
+        mmus = [create_mmu(sim.replacement_mode, sim.frames, filename, sim.seed, trace.page_map, page_offset)
+                for sim in sims]
+        warm_times = simulate_lockstep(trace, mmus, last=warmup)
+        warm = [counters(mmu) for mmu in mmus]
+        times = [before + after for (before, after) in zip(warm_times, simulate_lockstep(trace, mmus, first=warmup))]
+    no_events = max(trace.event_count() - warmup, 0)
+
+    results = {}
+    for sim, mmu, warm_counters, delta in zip(sims, mmus, warm, times):
+        report = PhaseTimer()
+        with report.phase("report"):
+            (reads, writes, fault_rate) = post_warmup(mmu, warm_counters, no_events)
+            od = OutputData(
+                filename,
+                name_of_mmu(mmu),
+                sim.frames,
+                no_events,
+                reads,
+                writes,
+                fault_rate,
+                memory.peak_rss_kb,
+                memory.peak_traced_kb,
+                phases["parse"] / len(sims),
+                delta,
+                page_size=1 << page_offset
+            )
+            print(f"{format_row(od)}{delta}s")
+        od.report_sec = report["report"]
+        results[result_key(sim)] = (od, delta)
+    return results
+
+def simulate_forks(task: ForkTask):
+    '''Warm every configuration up once on the first sim.warmup events of a
+    trace, then fork the warm MMUs with snapshot()/restore() to continue over
+    the events after the warm-up of each tail trace.
+    Returns a list of (warm-up trace, seed, OutputData of the tail, time_sec)
+    with post-warm-up counters; time_sec covers only the tail.
+    Forks run on page numbers: every trace would get its own dense ids.
+    '''
+    filename = f"{task.trace_file.value}.trace"
+    results = []
+    with memory_sampler() as memory:
+        with loading_trace(filename):
+            trace = get_trace(filename, task.page_offset)
+        tails = []
+        for tail_file in task.tail_files:
+            tail_name = f"{tail_file.value}.trace"
+            with loading_trace(tail_name):
+                tails.append((tail_name, get_trace(tail_name, task.page_offset)))
+
+        warmup = task.sims[0].warmup
+        mmus = [create_mmu(sim.replacement_mode, sim.frames, filename, sim.seed) for sim in task.sims]
+        simulate_lockstep(trace, mmus, last=warmup)
+        snapshots = [mmu.snapshot() for mmu in mmus]
+        del mmus
+
+        for (tail_name, tail) in tails:
+            forks = [create_mmu(sim.replacement_mode, sim.frames, tail_name, sim.seed) for sim in task.sims]
+            for (fork, snapshot) in zip(forks, snapshots):
+                fork.restore(snapshot)
+            warm = [counters(fork) for fork in forks]
+            times = simulate_lockstep(tail, forks, first=warmup)
+            no_events = max(len(tail) - warmup, 0)
+            for (sim, fork, warm_counters, delta) in zip(task.sims, forks, warm, times):
+                (reads, writes, fault_rate) = post_warmup(fork, warm_counters, no_events)
+                od = OutputData(
+                    tail_name,
+                    name_of_mmu(fork),
+                    sim.frames,
+                    no_events,
+                    reads,
+                    writes,
+                    fault_rate,
+                    memory.peak_rss_kb,
+                    memory.peak_traced_kb,
+                    simulate_sec=delta,
+                    page_size=1 << task.page_offset
+                )
+                print(f"{filename:<14}>{format_row(od)}{delta}s")
+                results.append((filename, sim.seed, od, delta))
+    return results
+
+def plan_sweep(sims: list[SimulationParameters], jobs: int = 1):
+    '''Split simulations into independent tasks.
+    Returns the tasks, and for every simulation in order
+    the index of the task that produces it and its result_key().
+    '''
+    tasks = []
+    rows = []
+    lru_frames = {}
+    lockstep_sims = {}
+    for sim_params in sims:
+        key = result_key(sim_params)
+        if sim_params.debug_mode is not DebugMode.QUIET or instrumented_runs():
+            # Traced runs need their own MMU
+            rows.append((len(tasks), key))
+            tasks.append(sim_params)
+        elif sim_params.replacement_mode is ReplacementMMU.lru and not sim_params.warmup:
+            # LRU runs of a trace and page size share one stack distance pass
+            trace_key = (sim_params.trace_file, sim_params.page_offset)
+            lru_frames.setdefault(trace_key, []).append(sim_params.frames)
+            rows.append(((trace_key, ReplacementMMU.lru), key))
         else:
-            print(f"Badly formatted file. Error on line {no_events + 1}")
-            return
+            # The other runs of a trace and page size share lockstep passes,
+            # split so that every worker gets a share of each trace
+            trace_key = (sim_params.trace_file, sim_params.page_offset)
+            lockstep_sims.setdefault(trace_key, []).append(sim_params)
+            rows.append(((trace_key, key), key))
 
-        # Track peak memory usage after each memory operation
-        current_memory = get_memory_usage()
-        if current_memory > peak_memory:
-            peak_memory = current_memory
+    shared_tasks = {}
+    for (trace_key, frames_range) in lru_frames.items():
+        shared_tasks[(trace_key, ReplacementMMU.lru)] = len(tasks)
+        (trace_file, page_offset) = trace_key
+        tasks.append(LruStackTask(trace_file, frames_range, page_offset))
 
-        no_events += 1
+    for (trace_key, trace_sims) in lockstep_sims.items():
+        groups = min(jobs, len(trace_sims))
+        for group in range(groups):
+            group_sims = trace_sims[group::groups]
+            for sim in group_sims:
+                shared_tasks[(trace_key, result_key(sim))] = len(tasks)
+            tasks.append(LockstepTask(trace_key[0], group_sims))
 
-    reads = mmu.get_total_disk_reads()
-    writes = mmu.get_total_disk_writes()
-    fault_rate = mmu.get_total_page_faults() / no_events
+    # Resolve the shared rows to their task index
+    rows = [(shared_tasks.get(task, task), key) for (task, key) in rows]
+    return tasks, rows
 
-    print(f"{filename:<14}|{name_of_mmu(mmu):<8}|{frames: 8d}|{no_events: 8d}|{mmu.get_total_disk_reads(): 7d} reads|{mmu.get_total_disk_writes(): 7d} writes|{fault_rate: 8.3%}|", end='')
-    
-    return OutputData(
-        filename,
-        name_of_mmu(mmu),
-        frames,
-        no_events,
-        reads,
-        writes,
-        fault_rate,
-        peak_memory
+def cache_key(cache: ResultCache, sim: SimulationParameters):
+    mode = sim.replacement_mode
+    # Every module a result may come through: the parser, the drivers here,
+    # the lockstep and stack distance passes and compaction. This module is
+    # imported by name, as it is __main__ when run as a script
+    extra_modules = [tracefile, lockstep, stackdist, compaction, importlib.import_module("evaluate")]
+    seed = sim.seed if mode is ReplacementMMU.rand else None
+    return cache.key(f"{sim.trace_file.value}.trace", mode.value, sim.frames, sim.page_offset, seed,
+                     sim.warmup, extra_modules=extra_modules)
+
+def lookup_cached(cache: ResultCache, sims: list[SimulationParameters]):
+    '''Split sims into a dict of index -> (OutputData, time_sec) found in the cache,
+    a dict of index -> cache key for the simulations to run, and those simulations.
+    Debug and traced runs are never cached.
+    '''
+    cached = {}
+    keys = {}
+    missing = []
+    for (index, sim) in enumerate(sims):
+        if cache is None or sim.debug_mode is not DebugMode.QUIET or instrumented_runs():
+            missing.append(sim)
+            continue
+        try:
+            key = cache_key(cache, sim)
+        except FileNotFoundError:
+            # Let the simulation report the missing trace
+            missing.append(sim)
+            continue
+        entry = cache.get(key)
+        if entry is not None:
+            od = OutputData(**entry["output"])
+            # Traces with the same contents share entries, keep this trace's name
+            od.filename = f"{sim.trace_file.value}.trace"
+            cached[index] = (od, entry["time_sec"])
+        else:
+            keys[index] = key
+            missing.append(sim)
+    return cached, keys, missing
+
+def run_task(task):
+    '''Run one task of plan_sweep(). Returns a dict of result_key() -> (OutputData, time_sec).'''
+    if isinstance(task, SimulationParameters):
+        (od, delta) = simulate(task)
+        return {result_key(task): (od, delta)}
+
+    if isinstance(task, LockstepTask):
+        return simulate_lockstep_group(task.trace_file, task.sims)
+
+    (results, delta) = simulate_lru_stack(task.trace_file, task.frames_range, task.page_offset)
+    # The pass covers every frame count, so its time is shared between them
+    share = delta / len(task.frames_range)
+    return {key: (od, share) for (key, od) in results.items()}
+
+def run_sweep(factory: SimulationFactory, jobs: int = 1, cache: ResultCache = None):
+    '''Yield (OutputData, time_sec) for every simulation of the factory, in order.
+    With a cache, only the simulations without a stored result are run, and
+    their results are stored. With jobs > 1 the tasks run in a pool of worker
+    processes; the rows are still yielded in enumerate order as soon as they
+    are available.
+    '''
+    sims = list(factory.enumerate())
+    cached, keys, missing = lookup_cached(cache, sims)
+    tasks, rows = plan_sweep(missing, jobs)
+    rows = iter(rows)
+
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=configure_instrumentation,
+                                   initargs=(memory_interval, trace_allocations, event_dir,
+                                             event_sample, event_evictions_only, window_events, window_dir))
+        futures = [pool.submit(run_task, task) for task in tasks]
+    else:
+        pool = None
+        done = {}
+
+    def result_of(task_index):
+        if pool is not None:
+            return futures[task_index].result()
+        if task_index not in done:
+            done[task_index] = run_task(tasks[task_index])
+        return done[task_index]
+
+    try:
+        for index in range(len(sims)):
+            if index in cached:
+                (od, delta) = cached[index]
+                print(f"{format_row(od)}cached")
+                yield od, delta
+                continue
+            (task_index, key) = next(rows)
+            (od, delta) = result_of(task_index)[key]
+            if index in keys:
+                cache.put(keys[index], {"output": asdict(od), "time_sec": delta})
+            yield od, delta
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def combine_seeds(rows):
+    '''Merge consecutive rows of the same trace, page size, mode and frames (the
+    runs of one configuration with different seeds) into one row with the mean
+    counts and the standard deviation of the fault rate. Times add up, memory
+    is the peak.
+    '''
+    def configuration(od):
+        return (od.filename, od.page_size, od.mmu_name, od.frames)
+
+    group = []
+    for (od, delta) in rows:
+        if group and configuration(od) != configuration(group[0][0]):
+            yield _combined(group)
+            group = []
+        group.append((od, delta))
+    if group:
+        yield _combined(group)
+
+def _combined(group):
+    if len(group) == 1:
+        return group[0]
+    outputs = [od for (od, _) in group]
+    fault_rates = [od.fault_rate for od in outputs]
+    od = OutputData(
+        outputs[0].filename,
+        outputs[0].mmu_name,
+        outputs[0].frames,
+        outputs[0].events,
+        statistics.fmean(od.reads for od in outputs),
+        statistics.fmean(od.writes for od in outputs),
+        statistics.fmean(fault_rates),
+        max(od.peak_memory for od in outputs),
+        max(od.peak_traced for od in outputs),
+        sum(od.parse_sec for od in outputs),
+        sum(od.simulate_sec for od in outputs),
+        sum(od.report_sec for od in outputs),
+        len(outputs),
+        statistics.stdev(fault_rates),
+        outputs[0].page_size
     )
+    return od, sum(delta for (_, delta) in group)
+
+def positive_int(text):
+    '''argparse type of counts that must be at least 1.'''
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return value
 
 def main():
+    parser = argparse.ArgumentParser(description="Sweep every trace, replacement mode and frame count into output.csv")
+    parser.add_argument("--jobs", type=positive_int, default=1, help="number of worker processes (default: 1, serial)")
+    parser.add_argument("--modes", nargs="+", choices=[x.name for x in ReplacementMMU], default=[x.name for x in ReplacementMMU],
+                        help="replacement modes to sweep (default: all)")
+    parser.add_argument("--memory-interval", type=float, default=0.05,
+                        help="seconds between background RSS samples, 0 for start and end only (default: 0.05)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record the tracemalloc peak (slower)")
+    parser.add_argument("--max-exponent", type=int, default=12, help="largest frame count is 2**max_exponent (default: 12)")
+    parser.add_argument("--event-dir", help="write a binary event trace of every run to this directory (see eventtrace.py)")
+    parser.add_argument("--event-sample", type=int, default=1, help="record every Nth access in event traces (default: 1)")
+    parser.add_argument("--event-evictions-only", action="store_true", help="record only evictions and write-backs in event traces")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"reuse and store results in this directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="run every simulation and store nothing")
+    parser.add_argument("--seeds", type=positive_int, default=1,
+                        help="run the random policy with this many seeds and report the mean and spread (default: 1)")
+    parser.add_argument("--warmup", type=int, default=0,
+                        help="simulate this many events of each trace before counting (default: 0)")
+    parser.add_argument("--fork", action="store_true",
+                        help="with --warmup, also continue each trace's warm MMUs over every trace into forks.csv")
+    parser.add_argument("--window", type=int, default=0,
+                        help="write the faults, reads and writes of every N events of each run (see timeseries.py)")
+    parser.add_argument("--window-dir", default="windows", help="directory for the --window time series (default: windows)")
+    parser.add_argument("--prefetch", choices=list(PREFETCHERS),
+                        help="also run every configuration but opt with this readahead into prefetch.csv (see prefetch.py)")
+    parser.add_argument("--writeback", action="store_true",
+                        help="also run every configuration with a page cleaner and disk model into writeback.csv (see writeback.py)")
+    parser.add_argument("--dirty-high", type=float, default=DEFAULT_HIGH_WATERMARK,
+                        help=f"with --writeback, dirty fraction of the frames that starts the cleaner (default: {DEFAULT_HIGH_WATERMARK})")
+    parser.add_argument("--dirty-low", type=float, default=DEFAULT_LOW_WATERMARK,
+                        help=f"with --writeback, dirty fraction the cleaner stops at (default: {DEFAULT_LOW_WATERMARK})")
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[1 << PAGE_OFFSET],
+                        help=f"page sizes in bytes to sweep, powers of two of at least {1 << PAGE_OFFSET} (default: {1 << PAGE_OFFSET})")
+    args = parser.parse_args()
+    for page_size in args.page_sizes:
+        if page_size < 1 << PAGE_OFFSET or page_size & (page_size - 1):
+            print(f"Page size must be a power of two of at least {1 << PAGE_OFFSET} bytes")
+            return
+    if not 0 <= args.dirty_low <= args.dirty_high:
+        print("Watermarks must satisfy 0 <= low <= high")
+        return
+    for trace_file in TraceFile:
+        # Checked here, as the sweep's workers and cache need every trace
+        if not os.path.isfile(f"{trace_file.value}.trace"):
+            print(f"Input '{trace_file.value}.trace' could not be found")
+            return
+    if args.fork and args.warmup <= 0:
+        print("--fork needs a warm-up length, see --warmup")
+        return
+    if args.event_dir is not None:
+        os.makedirs(args.event_dir, exist_ok=True)
+    if args.window > 0:
+        os.makedirs(args.window_dir, exist_ok=True)
+    configure_instrumentation(args.memory_interval, args.tracemalloc,
+                              args.event_dir, args.event_sample, args.event_evictions_only,
+                              args.window, args.window_dir)
+
     #frame_list = [2,4,8,16,32]  # Add 16 and 32 frames to the simulation
-    max_exponent = 12
+    max_exponent = args.max_exponent
     frame_list = [2 ** x for x in range(0, max_exponent + 1)]
 
     factory = SimulationFactory(
         [x for x in TraceFile],
         frame_list,
-        [x for x in ReplacementMMU],
-        [DebugMode.QUIET]
+        [ReplacementMMU[x] for x in args.modes],
+        [DebugMode.QUIET],
+        list(range(DEFAULT_SEED, DEFAULT_SEED + args.seeds)),
+        args.warmup,
+        [page_size.bit_length() - 1 for page_size in dict.fromkeys(args.page_sizes)]
     )
 
+    try:
+        write_outputs(factory, args)
+    except TraceLoadError as err:
+        print(err)
+
+def write_outputs(factory: SimulationFactory, args):
+    '''Run the sweep into output.csv, and the extra runs the arguments ask for.'''
     with open("output.csv", "w") as outfile:
-        outfile.write("trace,mmu,frames,no_events,reads,writes,fault_rate,time_sec\r\n")
-        for sim_params in factory.enumerate():
-            (od, delta) = simulate(sim_params)
-            output_line = f"{od.filename},{od.mmu_name},{od.frames},{od.events},{od.reads},{od.writes},{od.fault_rate},{delta}\r\n"
+        outfile.write("trace,mmu,frames,no_events,reads,writes,fault_rate,time_sec,"
+                      "parse_sec,simulate_sec,report_sec,peak_rss_kb,peak_traced_kb,seeds,fault_rate_stdev,page_size\r\n")
+        cache = None if args.no_cache else ResultCache(args.cache_dir)
+        for (od, delta) in combine_seeds(run_sweep(factory, args.jobs, cache)):
+            output_line = (f"{od.filename},{od.mmu_name},{od.frames},{od.events},{od.reads},{od.writes},{od.fault_rate},{delta},"
+                           f"{od.parse_sec},{od.simulate_sec},{od.report_sec},{od.peak_memory},{od.peak_traced},"
+                           f"{od.seeds},{od.fault_rate_stdev},{od.page_size}\r\n")
             outfile.write(output_line)
 
+    if args.fork:
+        run_forks(factory, args.jobs)
+    if args.prefetch is not None:
+        run_prefetch(factory, args.prefetch, args.jobs)
+    if args.writeback:
+        run_writeback(factory, args.dirty_high, args.dirty_low, args.jobs)
+
+@thread_timer
+def simulate_prefetch(task: PrefetchTask):
+    '''Simulate one configuration with readahead.
+    Returns (OutputData of the demand counters, (prefetch reads, useful prefetches, pollution evictions)).
+    '''
+    sim = task.sim
+    filename = f"{sim.trace_file.value}.trace"
+    with memory_sampler() as memory:
+        # Readahead guesses pages from their numbers, so no dense ids
+        with loading_trace(filename):
+            trace = get_trace(filename, sim.page_offset)
+
+        mmu = create_mmu(sim.replacement_mode, sim.frames, filename, sim.seed, page_offset=sim.page_offset)
+        readahead = Readahead(mmu, PREFETCHERS[task.prefetcher](sim.frames))
+        for pages, writes in trace.chunks(last=sim.warmup):
+            readahead.access_batch(pages, writes)
+        warm = counters(readahead)
+        warm_prefetch = (readahead.get_prefetch_reads(), readahead.get_useful_prefetches(), readahead.get_pollution_evictions())
+        for pages, writes in trace.chunks(first=sim.warmup):
+            readahead.access_batch(pages, writes)
+
+    no_events = max(len(trace) - sim.warmup, 0)
+    (reads, writes, fault_rate) = post_warmup(readahead, warm, no_events)
+    prefetch_counts = (readahead.get_prefetch_reads(), readahead.get_useful_prefetches(), readahead.get_pollution_evictions())
+    od = OutputData(
+        filename,
+        name_of_mmu(mmu),
+        sim.frames,
+        no_events,
+        reads,
+        writes,
+        fault_rate,
+        memory.peak_rss_kb,
+        memory.peak_traced_kb,
+        page_size=1 << sim.page_offset
+    )
+    print(format_row(od), end='')
+    return od, tuple(now - before for (now, before) in zip(prefetch_counts, warm_prefetch))
+
+def run_prefetch(factory: SimulationFactory, prefetcher: str, jobs: int = 1):
+    '''Write prefetch.csv: every configuration run again with readahead.'''
+    # The next use index of OPT has one entry per event, prefetches would shift it
+    tasks = [PrefetchTask(sim, prefetcher) for sim in factory.enumerate()
+             if sim.replacement_mode is not ReplacementMMU.opt]
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=configure_instrumentation,
+                                 initargs=(memory_interval, trace_allocations)) as pool:
+            task_results = list(pool.map(simulate_prefetch, tasks))
+    else:
+        task_results = [simulate_prefetch(task) for task in tasks]
+
+    with open("prefetch.csv", "w") as outfile:
+        outfile.write("trace,mmu,frames,prefetcher,no_events,reads,writes,fault_rate,"
+                      "prefetch_reads,useful_prefetches,pollution_evictions,time_sec,page_size,seed\r\n")
+        # Seeds of the random policy get a row each, with their seed
+        for (task, (result, delta)) in zip(tasks, task_results):
+            (od, (prefetch_reads, useful, pollution)) = result
+            outfile.write(f"{od.filename},{od.mmu_name},{od.frames},{prefetcher},{od.events},{od.reads},{od.writes},"
+                          f"{od.fault_rate},{prefetch_reads},{useful},{pollution},{delta},{od.page_size},{task.sim.seed}\r\n")
+
+@thread_timer
+def simulate_writeback(task: WritebackTask):
+    '''Simulate one configuration with a page cleaner and the disk model.
+    Returns (OutputData, (background writes, eviction writes, stall seconds, elapsed seconds)).
+    '''
+    sim = task.sim
+    filename = f"{sim.trace_file.value}.trace"
+    with memory_sampler() as memory:
+        with loading_trace(filename):
+            trace = get_trace(filename, sim.page_offset)
+
+        mmu = create_mmu(sim.replacement_mode, sim.frames, filename, sim.seed, page_offset=sim.page_offset)
+        cleaner = PageCleaner(mmu, sim.frames, high_watermark=task.high_watermark, low_watermark=task.low_watermark)
+        for pages, writes in trace.chunks(last=sim.warmup):
+            cleaner.access_batch(pages, writes)
+        warm = counters(cleaner)
+        warm_timing = (cleaner.get_background_writes(), cleaner.get_eviction_writes(),
+                       cleaner.get_stall_time(), cleaner.get_elapsed_time())
+        for pages, writes in trace.chunks(first=sim.warmup):
+            cleaner.access_batch(pages, writes)
+
+    no_events = max(len(trace) - sim.warmup, 0)
+    (reads, writes, fault_rate) = post_warmup(cleaner, warm, no_events)
+    timing = (cleaner.get_background_writes(), cleaner.get_eviction_writes(),
+              cleaner.get_stall_time(), cleaner.get_elapsed_time())
+    od = OutputData(
+        filename,
+        name_of_mmu(mmu),
+        sim.frames,
+        no_events,
+        reads,
+        writes,
+        fault_rate,
+        memory.peak_rss_kb,
+        memory.peak_traced_kb,
+        page_size=1 << sim.page_offset
+    )
+    print(format_row(od), end='')
+    return od, tuple(now - before for (now, before) in zip(timing, warm_timing))
+
+def run_writeback(factory: SimulationFactory, high_watermark: float, low_watermark: float, jobs: int = 1):
+    '''Write writeback.csv: every configuration run again with a page cleaner and the disk model.'''
+    tasks = [WritebackTask(sim, high_watermark, low_watermark) for sim in factory.enumerate()]
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=configure_instrumentation,
+                                 initargs=(memory_interval, trace_allocations)) as pool:
+            task_results = list(pool.map(simulate_writeback, tasks))
+    else:
+        task_results = [simulate_writeback(task) for task in tasks]
+
+    with open("writeback.csv", "w") as outfile:
+        outfile.write("trace,mmu,frames,no_events,reads,writes,fault_rate,"
+                      "background_writes,eviction_writes,stall_sec,elapsed_sec,time_sec,page_size,seed\r\n")
+        # Seeds of the random policy get a row each, with their seed
+        for (task, (result, delta)) in zip(tasks, task_results):
+            (od, (background_writes, eviction_writes, stall, elapsed)) = result
+            outfile.write(f"{od.filename},{od.mmu_name},{od.frames},{od.events},{od.reads},{od.writes},{od.fault_rate},"
+                          f"{background_writes},{eviction_writes},{stall},{elapsed},{delta},{od.page_size},{task.sim.seed}\r\n")
+
+def run_forks(factory: SimulationFactory, jobs: int = 1):
+    '''Write forks.csv: every trace's warmed-up configurations continued over every trace.'''
+    # The next use index of OPT belongs to one trace, so its state cannot move to another
+    sims = [sim for sim in factory.enumerate() if sim.replacement_mode is not ReplacementMMU.opt]
+    tasks = [ForkTask(trace_file,
+                      [sim for sim in sims if sim.trace_file is trace_file and sim.page_offset == page_offset],
+                      factory.trace_files, page_offset)
+             for trace_file in factory.trace_files for page_offset in factory.page_offsets]
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=configure_instrumentation,
+                                 initargs=(memory_interval, trace_allocations)) as pool:
+            task_results = list(pool.map(simulate_forks, tasks))
+    else:
+        task_results = [simulate_forks(task) for task in tasks]
+
+    with open("forks.csv", "w") as outfile:
+        outfile.write("warmup_trace,trace,mmu,frames,no_events,reads,writes,fault_rate,time_sec,page_size,seed\r\n")
+        for results in task_results:
+            for (warmup_file, seed, od, delta) in results:
+                outfile.write(f"{warmup_file},{od.filename},{od.mmu_name},{od.frames},{od.events},"
+                              f"{od.reads},{od.writes},{od.fault_rate},{delta},{od.page_size},{seed}\r\n")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+'''
+* Structured event tracing for the MMUs.
+* An MMU with a tracer reports every hit, fault, eviction and dirty write-back
+* through tracer.record(kind, page_number, frame_index). The tracer numbers
+* the accesses itself: each access ends with exactly one HIT or FAULT, and
+* the EVICT/WRITEBACK records of a fault come just before its FAULT record.
+*
+* EventTracer stores fixed-size binary records in a preallocated ring
+* buffer. With a path, the buffer is written to the file in one block each
+* time it fills up; without one, it keeps the most recent records only.
+* It can sample every Nth access or keep only evictions and write-backs.
+* TextTracer prints the same events, and is what set_debug() installs.
+* Both translate the dense page ids of array-based MMUs back to page numbers
+* when given the trace's page_map.
+*
+* File layout: a header (magic, version, record size) followed by records
+* of kind (1 byte), frame index (int32), page number (int64) and access
+* index (uint64), little endian.
+*
+* Usage: python eventtrace.py eventfile [--kind KIND] [--page PAGE] [--summary]
+'''
+import argparse
+import struct
+
+HIT = 0
+FAULT = 1
+EVICT = 2
+WRITEBACK = 3
+KIND_NAMES = ["hit", "fault", "evict", "writeback"]
+
+MAGIC = b'MEVT'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+RECORD = struct.Struct('<B3xiqQ')
+DEFAULT_CAPACITY = 1 << 16  # records held in memory
+
+
+class TextTracer:
+    '''Prints every event, one line each.'''
+
+    def __init__(self, out=None, page_map=None):
+        self.out = out
+        self.page_map = page_map  # Translates dense page ids back to page numbers
+        self.events = 0  # Accesses seen so far
+
+    def record(self, kind, page_number, frame_index):
+        if self.page_map is not None:
+            page_number = self.page_map[page_number]
+        print(f"[{self.events}] {KIND_NAMES[kind]} page {page_number} frame {frame_index}", file=self.out)
+        if kind <= FAULT:
+            self.events += 1
+
+    def close(self):
+        pass
+
+
+class EventTracer:
+    '''Records events as binary records in a ring buffer.
+    sample_every records only the accesses whose index is a multiple of it,
+    evictions_only keeps only EVICT and WRITEBACK records.
+    '''
+
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY, sample_every=1, evictions_only=False, page_map=None):
+        self.capacity = capacity
+        self.page_map = page_map  # Translates dense page ids back to page numbers
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.count = 0  # Records in the buffer
+        self.start = 0  # Oldest record in the buffer, once it has wrapped
+        self.dropped = 0  # Records overwritten when there is no file
+        self.written = 0  # Records flushed to the file
+        self.events = 0  # Accesses seen so far
+        self.sample_every = sample_every
+        self.evictions_only = evictions_only
+        self.outfile = None
+        if path is not None:
+            self.outfile = open(path, 'wb')
+            self.outfile.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+
+    def record(self, kind, page_number, frame_index):
+        index = self.events
+        if kind <= FAULT:
+            self.events += 1
+            if self.evictions_only:
+                return
+        if self.sample_every > 1 and index % self.sample_every:
+            return
+        if self.page_map is not None:
+            page_number = self.page_map[page_number]
+
+        if self.count == self.capacity:
+            if self.outfile is not None:
+                self.flush()
+            else:
+                # Overwrite the oldest record
+                RECORD.pack_into(self.buffer, self.start * RECORD.size, kind, frame_index, page_number, index)
+                self.start = (self.start + 1) % self.capacity
+                self.dropped += 1
+                return
+        RECORD.pack_into(self.buffer, self.count * RECORD.size, kind, frame_index, page_number, index)
+        self.count += 1
+
+    def records(self):
+        '''The records held in memory, oldest first, as (kind, frame, page, index).'''
+        size = RECORD.size
+        data = self.buffer[self.start * size:self.count * size] + self.buffer[:self.start * size]
+        return list(RECORD.iter_unpack(data))
+
+    def flush(self):
+        if self.outfile is None:
+            return
+        self.outfile.write(memoryview(self.buffer)[:self.count * RECORD.size])
+        self.written += self.count
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        if self.outfile is not None:
+            self.outfile.close()
+            self.outfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def read_events(path):
+    '''Yield (kind, frame, page, index) records from an event file.'''
+    with open(path, 'rb') as infile:
+        magic, version, record_size = HEADER.unpack(infile.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{path} is not an event trace file")
+        while True:
+            block = infile.read(RECORD.size * DEFAULT_CAPACITY)
+            if not block:
+                break
+            yield from RECORD.iter_unpack(block[:len(block) - len(block) % RECORD.size])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print or summarise an MMU event trace")
+    parser.add_argument("eventfile")
+    parser.add_argument("--kind", choices=KIND_NAMES, help="only show this kind of event")
+    parser.add_argument("--page", type=int, help="only show events on this page")
+    parser.add_argument("--summary", action="store_true", help="print counts per kind instead of records")
+    args = parser.parse_args()
+
+    kind_filter = KIND_NAMES.index(args.kind) if args.kind else None
+    counts = [0] * len(KIND_NAMES)
+    try:
+        for (kind, frame_index, page_number, index) in read_events(args.eventfile):
+            if kind_filter is not None and kind != kind_filter:
+                continue
+            if args.page is not None and page_number != args.page:
+                continue
+            if args.summary:
+                counts[kind] += 1
+            else:
+                print(f"{index} {KIND_NAMES[kind]} page {page_number} frame {frame_index}")
+    except (OSError, ValueError, struct.error) as err:
+        print(err)
+        return
+
+    if args.summary:
+        for name, count in zip(KIND_NAMES, counts):
+            print(f"{name:<10}{count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+'''
+* Least frequently used replacement with O(1) bookkeeping.
+* Resident pages are grouped in buckets by access count; each bucket keeps
+* its pages in LRU order, so the victim is the least recently used page of
+* the lowest non-empty count. An access moves its page to the next bucket,
+* and the lowest count is tracked incrementally (it can only drop to 1 on a
+* fault), so neither hits nor faults scan.
+*
+'''
+from mmu import MMU
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
+from collections import OrderedDict
+
+class LfuMMU(MMU):
+    __slots__ = ('frames', 'page_table', 'counts', 'buckets', 'min_count',
+                 'dirty', 'dirty_pages', 'used', 'disk_reads', 'disk_writes', 'page_faults',
+                 'tracer')
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.page_table = {}  # Maps page number to frame index in memory
+        self.counts = {}  # Maps page number to its access count
+        self.buckets = {}  # Maps access count to its pages, least recently used first
+        self.min_count = 0  # Lowest access count of a resident page
+        self.dirty = bytearray(frames)  # Modified bit of each frame
+        self.dirty_pages = 0  # Number of frames whose modified bit is set
+        self.used = 0  # Number of frames holding a page
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.tracer = None
+
+    def read_memory(self, page_number):
+        if page_number in self.page_table:
+            self._touch(page_number)
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, self.page_table[page_number])
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=False)
+
+    def write_memory(self, page_number):
+        frame_index = self.page_table.get(page_number)
+        if frame_index is not None:
+            self._touch(page_number)
+            if not self.dirty[frame_index]:
+                self.dirty[frame_index] = 1
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=True)
+
+    def _touch(self, page_number):
+        # Move the page to the bucket of its new access count
+        count = self.counts[page_number]
+        bucket = self.buckets[count]
+        del bucket[page_number]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = count + 1
+        count += 1
+        self.counts[page_number] = count
+        bucket = self.buckets.get(count)
+        if bucket is None:
+            bucket = self.buckets[count] = OrderedDict()
+        bucket[page_number] = None
+
+    def _handle_page_fault(self, page_number, dirty):
+        if self.used < self.frames:
+            # There is still space in memory
+            frame_index = self.used
+            self.used += 1
+        else:
+            # Replace the least recently used page of the lowest access count
+            bucket = self.buckets[self.min_count]
+            replaced_page, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[self.min_count]
+            del self.counts[replaced_page]
+            frame_index = self.page_table.pop(replaced_page)
+
+            # If the replaced page was written to, we need to increment disk writes
+            if self.dirty[frame_index]:
+                self.disk_writes += 1
+
+            if self.tracer is not None:
+                self.tracer.record(EVICT, replaced_page, frame_index)
+                if self.dirty[frame_index]:
+                    self.tracer.record(WRITEBACK, replaced_page, frame_index)
+
+        self.page_table[page_number] = frame_index
+        self.dirty_pages += dirty - self.dirty[frame_index]
+        self.dirty[frame_index] = dirty
+        self.counts[page_number] = 1
+        bucket = self.buckets.get(1)
+        if bucket is None:
+            bucket = self.buckets[1] = OrderedDict()
+        bucket[page_number] = None
+        self.min_count = 1
+
+        # Increment disk reads as we load the new page into memory
+        self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+    def get_resident_dirty_pages(self):
+        return self.dirty_pages
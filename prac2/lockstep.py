@@ -0,0 +1,27 @@
+'''
+* Lockstep simulation of several MMUs over one pass of a trace.
+* Policies that are not stack algorithms (clock, rand) need one simulation
+* per configuration, but they can still share the trace pass: every chunk of
+* events is decoded once and then fed to each MMU in turn. The CPU time
+* spent inside each MMU is measured per chunk, so every instance still gets
+* its own time figure.
+*
+'''
+from time import thread_time_ns
+
+from tracefile import CHUNK_EVENTS
+
+
+def simulate_lockstep(trace, mmus, chunk_events=CHUNK_EVENTS, first=0, last=None):
+    '''Run every MMU over the same events (first..last-1, all by default).
+    Returns the CPU time in seconds spent in each MMU, in the order given.
+    '''
+    times = [0] * len(mmus)
+    # Each chunk is decoded once for all MMUs
+    for pages, writes in trace.chunks(chunk_events, first, last):
+        for index, mmu in enumerate(mmus):
+            start_time = thread_time_ns()
+            mmu.access_batch(pages, writes)
+            times[index] += thread_time_ns() - start_time
+
+    return [t / 10**9 for t in times]
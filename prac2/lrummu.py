@@ -1,68 +1,100 @@
 from mmu import MMU
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
 from collections import OrderedDict
 
 class LruMMU(MMU):
+    __slots__ = ('frames', 'page_table', 'dirty', 'dirty_pages', 'used', 'disk_reads',
+                 'disk_writes', 'page_faults', 'tracer')
+
     def __init__(self, frames):
         self.frames = frames
-        self.page_table = OrderedDict()  # Keeps pages in the order of usage
-        self.memory = []  # Represents frames in memory
+        self.page_table = OrderedDict()  # Maps page number to frame index, in the order of usage
+        self.dirty = bytearray(frames)  # Modified bit of each frame
+        self.dirty_pages = 0  # Number of frames whose modified bit is set
+        self.used = 0  # Number of frames holding a page
         self.disk_reads = 0
         self.disk_writes = 0
         self.page_faults = 0
-        self.debug_mode = False
-
-    def set_debug(self):
-        self.debug_mode = True
-
-    def reset_debug(self):
-        self.debug_mode = False
+        self.tracer = None
 
     def read_memory(self, page_number):
         if page_number in self.page_table:
             # Page is already in memory, move it to the end to mark as recently used
             self.page_table.move_to_end(page_number)
-            if self.debug_mode:
-                print(f"Page {page_number} read from memory.")
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, self.page_table[page_number])
         else:
             # Page fault occurs
             self.page_faults += 1
-            self._handle_page_fault(page_number, mode='R')
+            self._handle_page_fault(page_number, dirty=False)
 
     def write_memory(self, page_number):
-        if page_number in self.page_table:
+        frame_index = self.page_table.get(page_number)
+        if frame_index is not None:
             # Page is already in memory, mark as modified and recently used
             self.page_table.move_to_end(page_number)
-            if self.debug_mode:
-                print(f"Page {page_number} written to memory.")
-            self.page_table[page_number] = 'W'
+            if not self.dirty[frame_index]:
+                self.dirty[frame_index] = 1
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
         else:
             # Page fault occurs
             self.page_faults += 1
-            self._handle_page_fault(page_number, mode='W')
+            self._handle_page_fault(page_number, dirty=True)
+
+    def access_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # Report every event to the tracer
+            return MMU.access_batch(self, pages, is_write)
 
-    def _handle_page_fault(self, page_number, mode):
-        if len(self.memory) < self.frames:
+        page_table = self.page_table
+        move_to_end = page_table.move_to_end
+        dirty = self.dirty
+        last_page = None
+        for page_number, write in zip(pages, is_write):
+            if page_number == last_page:
+                # Repeated hit on the most recently used page, only the modified bit can change
+                if write and not dirty[page_table[page_number]]:
+                    dirty[page_table[page_number]] = 1
+                    self.dirty_pages += 1
+            elif page_number in page_table:
+                move_to_end(page_number)
+                if write and not dirty[page_table[page_number]]:
+                    dirty[page_table[page_number]] = 1
+                    self.dirty_pages += 1
+            else:
+                self.page_faults += 1
+                self._handle_page_fault(page_number, dirty=write)
+            last_page = page_number
+
+    def _handle_page_fault(self, page_number, dirty):
+        if self.used < self.frames:
             # There is still space in memory
-            self.memory.append(page_number)
-            self.page_table[page_number] = mode
+            frame_index = self.used
+            self.used += 1
         else:
             # No space, we need to replace the least recently used page
-            lru_page, lru_mode = self.page_table.popitem(last=False)  # Removes and returns the LRU page
-            self.memory.remove(lru_page)
+            lru_page, frame_index = self.page_table.popitem(last=False)  # Removes and returns the LRU page
 
             # If the replaced page was written to, we need to increment disk writes
-            if lru_mode == 'W':
+            if self.dirty[frame_index]:
                 self.disk_writes += 1
 
-            # Replace the page in memory
-            self.memory.append(page_number)
-            self.page_table[page_number] = mode
+            if self.tracer is not None:
+                self.tracer.record(EVICT, lru_page, frame_index)
+                if self.dirty[frame_index]:
+                    self.tracer.record(WRITEBACK, lru_page, frame_index)
 
-            if self.debug_mode:
-                print(f"Page fault: loaded page {page_number} into memory, replaced LRU page {lru_page}")
+        # Load the page into the frame
+        self.page_table[page_number] = frame_index
+        self.dirty_pages += dirty - self.dirty[frame_index]
+        self.dirty[frame_index] = dirty
 
         # Increment disk reads as we load the new page into memory
         self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
 
     def get_total_disk_reads(self):
         return self.disk_reads
@@ -72,3 +104,137 @@ class LruMMU(MMU):
 
     def get_total_page_faults(self):
         return self.page_faults
+
+    def get_resident_dirty_pages(self):
+        return self.dirty_pages
+
+
+class DenseLruMMU(LruMMU):
+    '''LruMMU for traces renumbered by tracefile.densify(): page ids index
+    flat lists instead of hashing into the OrderedDict. The usage order is a
+    doubly linked list threaded through next_page/prev_page, with a sentinel
+    at index page_count whose next is the LRU page and whose prev is the MRU.
+    '''
+    __slots__ = ('page_map', 'frame_of', 'next_page', 'prev_page')
+
+    def __init__(self, frames, page_map):
+        LruMMU.__init__(self, frames)
+        page_count = len(page_map)
+        self.page_table = None  # Replaced by frame_of
+        self.page_map = page_map  # Page number of each page id
+        self.frame_of = [-1] * page_count  # Frame index of each page id, -1 if not resident
+        self.next_page = [page_count] * (page_count + 1)
+        self.prev_page = [page_count] * (page_count + 1)
+
+    def _move_to_end(self, page_id):
+        next_page = self.next_page
+        prev_page = self.prev_page
+        sentinel = len(self.frame_of)
+        before = prev_page[page_id]
+        after = next_page[page_id]
+        next_page[before] = after
+        prev_page[after] = before
+        last = prev_page[sentinel]
+        next_page[last] = page_id
+        prev_page[page_id] = last
+        next_page[page_id] = sentinel
+        prev_page[sentinel] = page_id
+
+    def read_memory(self, page_number):
+        frame_index = self.frame_of[page_number]
+        if frame_index >= 0:
+            # Page is already in memory, move it to the end to mark as recently used
+            self._move_to_end(page_number)
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=False)
+
+    def write_memory(self, page_number):
+        frame_index = self.frame_of[page_number]
+        if frame_index >= 0:
+            # Page is already in memory, mark as modified and recently used
+            self._move_to_end(page_number)
+            if not self.dirty[frame_index]:
+                self.dirty[frame_index] = 1
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=True)
+
+    def access_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # Report every event to the tracer
+            return MMU.access_batch(self, pages, is_write)
+
+        frame_of = self.frame_of
+        next_page = self.next_page
+        prev_page = self.prev_page
+        sentinel = len(frame_of)
+        dirty = self.dirty
+        for page_id, write in zip(pages, is_write):
+            frame_index = frame_of[page_id]
+            if frame_index < 0:
+                self.page_faults += 1
+                self._handle_page_fault(page_id, dirty=write)
+                continue
+            if write and not dirty[frame_index]:
+                dirty[frame_index] = 1
+                self.dirty_pages += 1
+            last = prev_page[sentinel]
+            if last != page_id:
+                # Unlink and append at the MRU end, inline for speed
+                before = prev_page[page_id]
+                after = next_page[page_id]
+                next_page[before] = after
+                prev_page[after] = before
+                next_page[last] = page_id
+                prev_page[page_id] = last
+                next_page[page_id] = sentinel
+                prev_page[sentinel] = page_id
+
+    def _handle_page_fault(self, page_number, dirty):
+        next_page = self.next_page
+        prev_page = self.prev_page
+        sentinel = len(self.frame_of)
+        if self.used < self.frames:
+            # There is still space in memory
+            frame_index = self.used
+            self.used += 1
+        else:
+            # No space, we need to replace the least recently used page
+            lru_page = next_page[sentinel]
+            after = next_page[lru_page]
+            next_page[sentinel] = after
+            prev_page[after] = sentinel
+            frame_index = self.frame_of[lru_page]
+            self.frame_of[lru_page] = -1
+
+            # If the replaced page was written to, we need to increment disk writes
+            if self.dirty[frame_index]:
+                self.disk_writes += 1
+
+            if self.tracer is not None:
+                self.tracer.record(EVICT, lru_page, frame_index)
+                if self.dirty[frame_index]:
+                    self.tracer.record(WRITEBACK, lru_page, frame_index)
+
+        # Load the page into the frame, as the most recently used
+        self.frame_of[page_number] = frame_index
+        last = prev_page[sentinel]
+        next_page[last] = page_number
+        prev_page[page_number] = last
+        next_page[page_number] = sentinel
+        prev_page[sentinel] = page_number
+        self.dirty_pages += dirty - self.dirty[frame_index]
+        self.dirty[frame_index] = dirty
+
+        # Increment disk reads as we load the new page into memory
+        self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
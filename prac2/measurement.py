@@ -1,11 +1,15 @@
 
 import os
 import sys
+import threading
 import traceback
+from contextlib import contextmanager
 from functools import wraps
 from multiprocessing import Process, Queue
 from time import thread_time_ns
 
+import psutil
+
 def thread_timer(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -78,4 +82,76 @@ def measure_memory(func):
         tracemalloc.stop()
         
         return result
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+class PhaseTimer:
+    '''Accumulates the thread CPU time spent in named phases,
+    like thread_timer but for parts of a function.
+    '''
+
+    def __init__(self):
+        self.times = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = thread_time_ns()
+        try:
+            yield
+        finally:
+            delta = (thread_time_ns() - start) / 10**9
+            self.times[name] = self.times.get(name, 0.0) + delta
+
+    def __getitem__(self, name):
+        return self.times.get(name, 0.0)
+
+
+class MemorySampler:
+    '''Samples the process memory on a background thread, so the code being
+    measured pays nothing per event. Records the peak RSS and, if
+    trace_allocations is set, the tracemalloc peak (tracemalloc slows every
+    allocation, so it is off by default). Use as a context manager.
+    '''
+
+    def __init__(self, interval=0.05, trace_allocations=False):
+        self.interval = interval
+        self.trace_allocations = trace_allocations
+        self.peak_rss_kb = 0
+        self.peak_traced_kb = 0
+        self._process = psutil.Process(os.getpid())
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_tracing = False
+
+    def sample(self):
+        rss = self._process.memory_info().rss // 1024
+        if rss > self.peak_rss_kb:
+            self.peak_rss_kb = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        if self.trace_allocations:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._started_tracing = True
+        self.sample()
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        self.sample()
+        if self.trace_allocations:
+            self.peak_traced_kb = tracemalloc.get_traced_memory()[1] // 1024
+            if self._started_tracing:
+                tracemalloc.stop()
+        return False
@@ -1,6 +1,12 @@
 from clockmmu import ClockMMU
 from lrummu import LruMMU
 from randmmu import RandMMU
+from optmmu import OptMMU, next_use_index
+from arcmmu import ArcMMU
+from twoqmmu import TwoQMMU
+from clockprommu import ClockProMMU
+from lfummu import LfuMMU
+from tracefile import open_trace, TraceFormatError, TraceStream
 
 import sys
 
@@ -19,13 +25,19 @@ def main():
     input_file = sys.argv[1]
 
     try:
-        with open(input_file, 'r') as file:
-            # Read the trace file contents
-            trace_contents = file.readlines()
+        # Load the trace (reusing its compiled form when it is up to date),
+        # or stream it if it is compressed or "-" for stdin
+        trace = open_trace(input_file, PAGE_OFFSET)
     except FileNotFoundError:
         print(f"Input '{input_file}' could not be found")
         print("Usage: python memsim.py inputfile numberframes replacementmode debugmode")
         return
+    except (OSError, EOFError) as err:
+        print(f"Input '{input_file}' could not be read: {err}")
+        return
+    except TraceFormatError as err:
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
 
     frames = int(sys.argv[2])
     if frames < 1:
@@ -41,8 +53,22 @@ def main():
         mmu = LruMMU(frames)
     elif replacement_mode == "clock":
         mmu = ClockMMU(frames)
+    elif replacement_mode == "arc":
+        mmu = ArcMMU(frames)
+    elif replacement_mode == "2q":
+        mmu = TwoQMMU(frames)
+    elif replacement_mode == "clockpro":
+        mmu = ClockProMMU(frames)
+    elif replacement_mode == "lfu":
+        mmu = LfuMMU(frames)
+    elif replacement_mode == "opt":
+        # OPT looks ahead, so it needs the whole trace up front
+        if isinstance(trace, TraceStream):
+            print("Replacement mode opt cannot be used with a compressed or stdin trace")
+            return
+        mmu = OptMMU(frames, next_use_index(trace.pages))
     else:
-        print("Invalid replacement mode. Valid options are [rand, lru, clock]")
+        print("Invalid replacement mode. Valid options are [rand, lru, clock, arc, 2q, clockpro, lfu, opt]")
         return
 
     debug_mode  = sys.argv[4]
@@ -60,26 +86,16 @@ def main():
     # Main Loop: Process the addresses from the trace file     #
     ############################################################
 
-    no_events = 0
-
-
-    with open(input_file, 'r') as trace_file:
-        for trace_line in trace_file:
-            trace_cmd = trace_line.strip().split(" ")
-            logical_address = int(trace_cmd[0], 16)
-            page_number = logical_address >>  PAGE_OFFSET
-
-
-            # Process read or write
-            if trace_cmd[1] == "R":
-                mmu.read_memory(page_number)
-            elif trace_cmd[1] == "W":
-                mmu.write_memory(page_number)
-            else:
-                print(f"Badly formatted file. Error on line {no_events + 1}")
-                return
+    try:
+        for pages, writes in trace.chunks():
+            # Process a chunk of reads and writes
+            mmu.access_batch(pages, writes)
+    except TraceFormatError as err:
+        # Only streamed traces are parsed while simulating
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
 
-            no_events += 1
+    no_events = len(trace)
 
     # TODO: Print results
     print(f"total memory frames: {frames}")
@@ -6,19 +6,76 @@
 * to analyse the performance of different replacement strategies implemented
 * for the MMU.
 *
+* Debugging goes through a tracer (see eventtrace.py): an MMU with a tracer
+* reports each hit, fault, eviction and write-back to it.
+*
+* snapshot() returns the whole state of an MMU (page table, frame arrays,
+* hands, counters, RNG state) as bytes, and restore() puts an MMU of the same
+* type back into that state, so a warmed-up MMU can be forked.
+*
+* clean_frame() clears the modified bit of a frame whose page was written
+* back ahead of eviction (see writeback.py).
+*
 '''
+import pickle
+
+from eventtrace import TextTracer
+
 class MMU:
+    __slots__ = ()
+    # Slots left out of snapshots: the tracer, and read-only data an MMU is built with
+    unsaved_slots = ('tracer', 'page_map')
+    # Dense MMUs take page ids from tracefile.densify() and keep its page_map in a slot
+    page_map = None
+
     def read_memory(self, page_number):
         pass
 
     def write_memory(self, page_number):
         pass
 
+    def access_batch(self, pages, is_write):
+        # Process a chunk of events; is_write[i] is true if pages[i] is written.
+        # Subclasses override this with a faster loop giving the same counters.
+        for page_number, write in zip(pages, is_write):
+            if write:
+                self.write_memory(page_number)
+            else:
+                self.read_memory(page_number)
+
+    def snapshot(self):
+        return pickle.dumps(self._get_state(), pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, snapshot):
+        # The tracer and unsaved slots are kept, everything else is replaced
+        self._set_state(pickle.loads(snapshot))
+
+    def _get_state(self):
+        # Subclasses with state that pickles badly override this and _set_state
+        return {name: getattr(self, name)
+                for cls in type(self).__mro__
+                for name in getattr(cls, '__slots__', ())
+                if name not in self.unsaved_slots}
+
+    def _set_state(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def set_tracer(self, tracer):
+        # Subclasses keep the tracer in a 'tracer' slot, None when not tracing
+        self.tracer = tracer
+
     def set_debug(self):
-        pass
+        self.set_tracer(TextTracer(page_map=self.page_map))
 
     def reset_debug(self):
-        pass
+        self.set_tracer(None)
+
+    def clean_frame(self, frame_index):
+        # Subclasses keep the modified bit of each frame in a 'dirty' bytearray
+        # and the number of set bits in 'dirty_pages'
+        self.dirty_pages -= self.dirty[frame_index]
+        self.dirty[frame_index] = 0
 
     def get_total_disk_reads(self):
         return -1
@@ -28,3 +85,8 @@ class MMU:
 
     def get_total_page_faults(self):
         return -1
+
+    def get_resident_dirty_pages(self):
+        # Number of resident pages whose modified bit is set, kept up to date
+        # by every MMU so that reading it is O(1)
+        return -1
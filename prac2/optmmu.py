@@ -0,0 +1,155 @@
+'''
+* Belady's optimal replacement (OPT / MIN).
+* On a fault the resident page whose next use is furthest in the future is
+* replaced. The next use of every event is precomputed in one backward pass
+* over the trace (next_use_index), and resident pages are kept in a max-heap
+* keyed on their next use, so picking a victim costs O(log frames).
+*
+* The heap is invalidated lazily: every access pushes a new entry for its
+* page and entries that no longer match the page's next use are skipped when
+* popped. It is rebuilt from the resident pages when stale entries pile up.
+*
+'''
+from mmu import MMU
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
+from array import array
+import heapq
+
+
+def next_use_index(pages):
+    '''For every event, the index of the next event on the same page,
+    or len(pages) if the page is never used again.
+    '''
+    events = len(pages)
+    next_use = array('q', [events]) * events
+    last_seen = {}
+    for i in range(events - 1, -1, -1):
+        page_number = pages[i]
+        next_use[i] = last_seen.get(page_number, events)
+        last_seen[page_number] = i
+    return next_use
+
+
+class OptMMU(MMU):
+    __slots__ = ('frames', 'next_use', 'position', 'heap', 'resident_next',
+                 'page_table', 'dirty', 'dirty_pages', 'used', 'disk_reads', 'disk_writes',
+                 'page_faults', 'tracer')
+    unsaved_slots = ('tracer', 'next_use')  # The next use index is shared, not copied
+
+    def __init__(self, frames, next_use):
+        self.frames = frames
+        self.next_use = next_use  # From next_use_index() of the trace being simulated
+        self.position = 0  # Index of the next event in the trace
+        self.heap = []  # (-next use, page number) of resident pages, may hold stale entries
+        self.resident_next = {}  # Maps resident page number to its next use
+        self.page_table = {}  # Maps page number to frame index in memory
+        self.dirty = bytearray(frames)  # Modified bit of each frame
+        self.dirty_pages = 0  # Number of frames whose modified bit is set
+        self.used = 0  # Number of frames holding a page
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.tracer = None
+
+    def read_memory(self, page_number):
+        self._access(page_number, 0)
+
+    def write_memory(self, page_number):
+        self._access(page_number, 1)
+
+    def _access(self, page_number, write):
+        next_use = self.next_use[self.position]
+        self.position += 1
+
+        frame_index = self.page_table.get(page_number)
+        if frame_index is not None:
+            if write and not self.dirty[frame_index]:
+                self.dirty[frame_index] = 1
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=write)
+
+        self._set_next_use(page_number, next_use)
+
+    def access_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # Report every event to the tracer
+            return MMU.access_batch(self, pages, is_write)
+
+        page_table = self.page_table
+        dirty = self.dirty
+        next_uses = self.next_use
+        position = self.position
+        for page_number, write in zip(pages, is_write):
+            next_use = next_uses[position]
+            position += 1
+            frame_index = page_table.get(page_number)
+            if frame_index is not None:
+                if write and not dirty[frame_index]:
+                    dirty[frame_index] = 1
+                    self.dirty_pages += 1
+            else:
+                self.page_faults += 1
+                self._handle_page_fault(page_number, dirty=write)
+            self._set_next_use(page_number, next_use)
+        self.position = position
+
+    def _set_next_use(self, page_number, next_use):
+        self.resident_next[page_number] = next_use
+        heapq.heappush(self.heap, (-next_use, page_number))
+        if len(self.heap) > 2 * self.frames + 64:
+            # Drop the stale entries
+            self.heap = [(-use, page) for (page, use) in self.resident_next.items()]
+            heapq.heapify(self.heap)
+
+    def _find_victim(self):
+        # Pop until an entry still matches its page's next use
+        while True:
+            (use, page_number) = heapq.heappop(self.heap)
+            if self.resident_next.get(page_number) == -use:
+                return page_number
+
+    def _handle_page_fault(self, page_number, dirty):
+        if self.used < self.frames:
+            # There is still space in memory
+            frame_index = self.used
+            self.used += 1
+        else:
+            # No space, replace the page used furthest in the future
+            replaced_page = self._find_victim()
+            frame_index = self.page_table.pop(replaced_page)
+            del self.resident_next[replaced_page]
+
+            # If the replaced page was written to, we need to increment disk writes
+            if self.dirty[frame_index]:
+                self.disk_writes += 1
+
+            if self.tracer is not None:
+                self.tracer.record(EVICT, replaced_page, frame_index)
+                if self.dirty[frame_index]:
+                    self.tracer.record(WRITEBACK, replaced_page, frame_index)
+
+        self.page_table[page_number] = frame_index
+        self.dirty_pages += dirty - self.dirty[frame_index]
+        self.dirty[frame_index] = dirty
+
+        # Increment disk reads as we load the new page into memory
+        self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+    def get_resident_dirty_pages(self):
+        return self.dirty_pages
@@ -0,0 +1,252 @@
+'''
+* Readahead (prefetching) in the fault path of any MMU.
+* Readahead wraps an MMU and installs itself as its tracer, so it sees
+* every fault and eviction whatever the replacement policy. After a demand
+* fault, or the first use of a prefetched page, it asks a prefetcher which
+* pages to read ahead and loads the ones not resident through the MMU's own
+* fault path, so they are placed and evicted like any other page.
+*
+* Prefetch loads are counted apart from demand faults and reads:
+*   prefetch reads       pages read from disk by readahead
+*   useful prefetches    prefetched pages used before they were evicted
+*   pollution evictions  prefetched pages evicted without being used
+* Write-backs are not split, as a dirty victim costs the same write either way.
+*
+* Prefetchers:
+*   sequential  when a page follows the previous one, read a window of the
+*               next pages. The window doubles (up to max_window) each time
+*               the stream reaches the first page of the last window, which
+*               then reads the next window ahead of use.
+*   stride      the same with any constant distance between pages, once two
+*               steps in a row had it, reading degree pages at a time.
+* Both read at most a quarter of the frames at a time, so the window being
+* read and the one being used fit beside the rest of the working set;
+* larger windows only evict their own unused pages.
+*
+* Pages are guessed from their numbers, so the MMU must see page numbers,
+* not the dense ids of tracefile.densify(). OPT cannot be wrapped: its next
+* use index has one entry per trace event.
+*
+* Usage: python prefetch.py tracefile frames mode prefetcher
+'''
+import sys
+
+from eventtrace import FAULT, EVICT
+
+DEFAULT_INITIAL_WINDOW = 4
+DEFAULT_MAX_WINDOW = 32
+DEFAULT_DEGREE = 4
+
+
+def _readahead_limit(frames):
+    return max(1, frames // 4)
+
+
+class SequentialPrefetcher:
+    def __init__(self, frames, initial_window=DEFAULT_INITIAL_WINDOW, max_window=DEFAULT_MAX_WINDOW):
+        self.max_window = min(max_window, _readahead_limit(frames))
+        self.initial_window = min(initial_window, self.max_window)
+        self.window = 0  # Pages of the last window, 0 while no stream is seen
+        self.last_page = None  # Page of the previous call
+        self.trigger = None  # First page of the last window
+        self.ahead = None  # First page after the last window
+
+    def access(self, page_number, fault):
+        '''Pages to read ahead after a fault on page_number, or the first use
+        of it after it was prefetched.'''
+        sequential = self.last_page is not None and page_number == self.last_page + 1
+        self.last_page = page_number
+        if not sequential:
+            self.window = 0
+            return ()
+        if fault or self.window == 0:
+            # A new stream, or one that caught up with its readahead
+            if self.window == 0:
+                self.window = self.initial_window
+            start = page_number + 1
+        elif page_number == self.trigger:
+            # Read the next window while this one is being used
+            self.window = min(2 * self.window, self.max_window)
+            start = self.ahead
+        else:
+            return ()
+        self.trigger = start
+        self.ahead = start + self.window
+        return range(start, self.ahead)
+
+
+class StridePrefetcher:
+    def __init__(self, frames, degree=DEFAULT_DEGREE):
+        self.degree = min(degree, _readahead_limit(frames))  # Pages read ahead at a time
+        self.stride = 0  # Distance between the last two pages
+        self.confirmed = False  # True once the stride was seen twice in a row
+        self.last_page = None
+        self.trigger = None  # First page of the last readahead
+        self.ahead = None  # Next page along the stride after the last readahead
+
+    def access(self, page_number, fault):
+        '''Pages to read ahead after a fault on page_number, or the first use
+        of it after it was prefetched.'''
+        if self.last_page is None:
+            self.last_page = page_number
+            return ()
+        stride = page_number - self.last_page
+        self.last_page = page_number
+        if stride == 0:
+            return ()
+        if stride != self.stride:
+            self.stride = stride
+            self.confirmed = False
+            return ()
+        if fault or not self.confirmed:
+            # A new stream, or one that caught up with its readahead
+            self.confirmed = True
+            start = page_number + stride
+        elif page_number == self.trigger:
+            start = self.ahead
+        else:
+            return ()
+        self.trigger = start
+        self.ahead = start + self.degree * stride
+        return range(start, self.ahead, stride)
+
+
+PREFETCHERS = {
+    "sequential": SequentialPrefetcher,
+    "stride": StridePrefetcher,
+}
+
+
+class Readahead:
+    '''Runs an MMU with a prefetcher in its fault path; has the MMU counters
+    for demand accesses and adds the prefetch ones.'''
+
+    def __init__(self, mmu, prefetcher):
+        self.mmu = mmu
+        self.prefetcher = prefetcher
+        self.resident = set()  # Resident pages, from the MMU's FAULT and EVICT records
+        self.unused = set()  # Prefetched pages not used since
+        self.prefetching = False  # True while a prefetch goes through the MMU
+        self.faulted = False  # Set when the current demand access faults
+        self.demand_faults = 0
+        self.prefetch_reads = 0
+        self.useful_prefetches = 0
+        self.pollution_evictions = 0
+        mmu.set_tracer(self)
+
+    def record(self, kind, page_number, frame_index):
+        # Tracer interface: follow residency and tell demand loads from prefetches
+        if kind == FAULT:
+            self.resident.add(page_number)
+            if self.prefetching:
+                self.prefetch_reads += 1
+            else:
+                self.faulted = True
+        elif kind == EVICT:
+            self.resident.discard(page_number)
+            if page_number in self.unused:
+                self.unused.discard(page_number)
+                self.pollution_evictions += 1
+
+    def access(self, page_number, write):
+        self.faulted = False
+        if write:
+            self.mmu.write_memory(page_number)
+        else:
+            self.mmu.read_memory(page_number)
+
+        if self.faulted:
+            self.demand_faults += 1
+        elif page_number in self.unused:
+            self.unused.discard(page_number)
+            self.useful_prefetches += 1
+        else:
+            return
+
+        for page in self.prefetcher.access(page_number, self.faulted):
+            if page >= 0 and page not in self.resident:
+                self.prefetching = True
+                self.mmu.read_memory(page)
+                self.prefetching = False
+                self.unused.add(page)
+
+    def access_batch(self, pages, is_write):
+        access = self.access
+        for page_number, write in zip(pages, is_write):
+            access(page_number, write)
+
+    def get_total_disk_reads(self):
+        # Demand reads only
+        return self.mmu.get_total_disk_reads() - self.prefetch_reads
+
+    def get_total_disk_writes(self):
+        return self.mmu.get_total_disk_writes()
+
+    def get_total_page_faults(self):
+        return self.demand_faults
+
+    def get_prefetch_reads(self):
+        return self.prefetch_reads
+
+    def get_useful_prefetches(self):
+        return self.useful_prefetches
+
+    def get_pollution_evictions(self):
+        return self.pollution_evictions
+
+
+def main():
+    from evaluate import ReplacementMMU, create_mmu
+    from tracefile import PAGE_OFFSET, TraceFormatError, open_trace
+
+    modes = {x.name: x for x in ReplacementMMU if x is not ReplacementMMU.opt}
+    modes["2q"] = modes.pop("twoq")
+    if len(sys.argv) < 5:
+        print("Usage: python prefetch.py tracefile frames mode prefetcher")
+        return
+
+    input_file = sys.argv[1]
+    try:
+        trace = open_trace(input_file, PAGE_OFFSET)
+    except FileNotFoundError:
+        print(f"Input '{input_file}' could not be found")
+        return
+    except (OSError, EOFError) as err:
+        print(f"Input '{input_file}' could not be read: {err}")
+        return
+    except TraceFormatError as err:
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
+
+    frames = int(sys.argv[2])
+    if frames < 1:
+        print("Frame number must be at least 1")
+        return
+    if sys.argv[3] not in modes:
+        print(f"Invalid replacement mode. Valid options are [{', '.join(modes)}]")
+        return
+    if sys.argv[4] not in PREFETCHERS:
+        print(f"Invalid prefetcher. Valid options are [{', '.join(PREFETCHERS)}]")
+        return
+
+    mmu = Readahead(create_mmu(modes[sys.argv[3]], frames, input_file), PREFETCHERS[sys.argv[4]](frames))
+    try:
+        for pages, writes in trace.chunks():
+            mmu.access_batch(pages, writes)
+    except TraceFormatError as err:
+        # Only streamed traces are parsed while simulating
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
+
+    no_events = len(trace)
+    print(f"total memory frames: {frames}")
+    print(f"events in trace: {no_events}")
+    print(f"total disk reads: {mmu.get_total_disk_reads()}")
+    print(f"total disk writes: {mmu.get_total_disk_writes()}")
+    print("page fault rate: {0:.4f}".format(mmu.get_total_page_faults() / no_events))
+    print(f"prefetch reads: {mmu.get_prefetch_reads()}")
+    print(f"useful prefetches: {mmu.get_useful_prefetches()}")
+    print(f"pollution evictions: {mmu.get_pollution_evictions()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+'''
+* Traces of several address spaces, one line per access with a process id:
+*     0041f7a0 R 3
+* (address in hex, R or W, decimal PID). Every process has its own page
+* table, so the same page number in two processes is two different pages.
+*
+* Two ways to share the frames between the processes:
+*   global  one MMU replaces over the pages of every process, as if all
+*           frames were one pool. (pid, page) pairs are renumbered to dense
+*           ids, so the array-based MMUs of lrummu, clockmmu and randmmu run
+*           on them directly.
+*   local   every process gets a quota of the frames and only replaces its
+*           own pages. The processes then never affect each other, so each
+*           one's events are simulated as a separate shard, in parallel
+*           worker processes, and the counters are summed.
+* Quotas are an equal share of the frames, or shares proportional to the
+* distinct pages of each process; every process gets at least one frame.
+*
+* Usage: python processtrace.py tracefile frames mode global|local
+*                               [--quota equal|pages] [--jobs N] [--seed S]
+'''
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from clockmmu import DenseClockMMU
+from lrummu import DenseLruMMU
+from randmmu import DenseRandMMU, DEFAULT_SEED
+from tracefile import PAGE_OFFSET, Trace, TraceFormatError, densify, read_blocks
+
+MMUS = {
+    "lru": DenseLruMMU,
+    "clock": DenseClockMMU,
+    "rand": DenseRandMMU,
+}
+
+QUOTAS = ("equal", "pages")
+
+
+@dataclass
+class ProcessTrace:
+    pids: array         # process id of every event
+    pages: array        # page number of every event, within its process
+    writes: bytearray   # 1 if the event is a write, 0 if it is a read
+    page_offset: int
+
+    def __len__(self):
+        return len(self.pages)
+
+    def split(self):
+        '''One Trace per process, in order of PID, with the events in trace order.'''
+        pages = {}
+        writes = {}
+        for (pid, page_number, write) in zip(self.pids, self.pages, self.writes):
+            if pid not in pages:
+                pages[pid] = array(self.pages.typecode)
+                writes[pid] = bytearray()
+            pages[pid].append(page_number)
+            writes[pid].append(write)
+        return {pid: Trace(pages[pid], writes[pid], self.page_offset) for pid in sorted(pages)}
+
+    def global_trace(self):
+        '''All events as one Trace of dense ids, one per (pid, page) pair.
+        Its page_map gives the page number (not the process) of every id.
+        '''
+        ids = {}
+        setdefault = ids.setdefault
+        dense = array('I', [setdefault(key, len(ids)) for key in zip(self.pids, self.pages)])
+        page_map = array('Q', (page_number for (_, page_number) in ids))
+        return Trace(dense, self.writes, self.page_offset, page_map)
+
+
+@dataclass
+class ProcessResult:
+    pid: int  # None for the sum over the processes
+    frames: int
+    events: int
+    faults: int
+    reads: int
+    writes: int
+
+
+def parse_process_lines(lines, line_number, page_offset, pids, pages, writes):
+    '''Parse trace lines (bytes) with a PID column, appending to pids, pages and writes.
+    line_number is the number of the first line, used in errors.
+    '''
+    for trace_line in lines:
+        fields = trace_line.split()
+        if len(fields) != 3:
+            raise TraceFormatError(line_number)
+        try:
+            logical_address = int(fields[0], 16)
+            pid = int(fields[2])
+        except ValueError:
+            raise TraceFormatError(line_number) from None
+        if fields[1] == b"R":
+            writes.append(0)
+        elif fields[1] == b"W":
+            writes.append(1)
+        else:
+            raise TraceFormatError(line_number)
+        if pid < 0:
+            raise TraceFormatError(line_number)
+        pids.append(pid)
+        pages.append(logical_address >> page_offset)
+        line_number += 1
+
+
+def load_process_trace(path, page_offset=PAGE_OFFSET):
+    pids = array('Q')
+    pages = array('Q')
+    writes = bytearray()
+    with open(path, 'rb') as trace_file:
+        for lines in read_blocks(trace_file):
+            parse_process_lines(lines, len(writes) + 1, page_offset, pids, pages, writes)
+    return ProcessTrace(pids, pages, writes, page_offset)
+
+
+def local_quotas(shards, frames, quota="equal"):
+    '''Frames of each process: a dict of pid -> frames, summing to frames.'''
+    if frames < len(shards):
+        raise ValueError(f"Local replacement needs at least one frame for each of the {len(shards)} processes")
+    pids = list(shards)
+    if quota == "equal":
+        weights = [1] * len(pids)
+    elif quota == "pages":
+        weights = [len(set(shards[pid].pages)) for pid in pids]
+    else:
+        raise ValueError(f"Invalid quota. Valid options are [{', '.join(QUOTAS)}]")
+
+    # One frame each, then the rest by weight, leftovers to the largest remainders
+    spare = frames - len(pids)
+    total = sum(weights)
+    shares = [spare * weight // total for weight in weights]
+    remainders = sorted(range(len(pids)), key=lambda i: (-(spare * weights[i] % total), i))
+    for i in remainders[:spare - sum(shares)]:
+        shares[i] += 1
+    return {pid: 1 + share for (pid, share) in zip(pids, shares)}
+
+
+def create_mmu(mode, frames, page_map, seed=DEFAULT_SEED):
+    mmu_class = MMUS[mode]
+    if mmu_class is DenseRandMMU:
+        return mmu_class(frames, page_map, seed)
+    return mmu_class(frames, page_map)
+
+
+def _run(mmu, trace):
+    for pages, writes in trace.chunks():
+        mmu.access_batch(pages, writes)
+    return mmu
+
+
+def simulate_global(trace, mode, frames, seed=DEFAULT_SEED):
+    '''Global replacement over every process. Returns the ProcessResult of the sum.'''
+    dense = trace.global_trace()
+    mmu = _run(create_mmu(mode, frames, dense.page_map, seed), dense)
+    return ProcessResult(None, frames, len(trace), mmu.get_total_page_faults(),
+                         mmu.get_total_disk_reads(), mmu.get_total_disk_writes())
+
+
+def simulate_shard(pid, shard, mode, frames, seed=DEFAULT_SEED):
+    '''Simulate one process on its own frames.'''
+    dense = densify(shard)
+    mmu = _run(create_mmu(mode, frames, dense.page_map, seed), dense)
+    return ProcessResult(pid, frames, len(shard), mmu.get_total_page_faults(),
+                         mmu.get_total_disk_reads(), mmu.get_total_disk_writes())
+
+
+def simulate_local(trace, mode, frames, quota="equal", jobs=1, seed=DEFAULT_SEED):
+    '''Local replacement, one shard per process, on jobs worker processes.
+    Returns the ProcessResult of every process and that of their sum.
+    '''
+    shards = trace.split()
+    quotas = local_quotas(shards, frames, quota)
+    pids = list(shards)
+    args = (pids, [shards[pid] for pid in pids], [mode] * len(pids),
+            [quotas[pid] for pid in pids], [seed] * len(pids))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # Larger chunks send fewer, bigger messages to the workers
+            results = list(pool.map(simulate_shard, *args, chunksize=max(1, len(pids) // (4 * jobs))))
+    else:
+        results = list(map(simulate_shard, *args))
+
+    total = ProcessResult(None, frames, len(trace),
+                          sum(result.faults for result in results),
+                          sum(result.reads for result in results),
+                          sum(result.writes for result in results))
+    return results, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a trace with a PID column, with global or local replacement")
+    parser.add_argument("tracefile")
+    parser.add_argument("frames", type=int)
+    parser.add_argument("mode", choices=list(MMUS))
+    parser.add_argument("replacement", choices=["global", "local"])
+    parser.add_argument("--quota", choices=QUOTAS, default="equal",
+                        help="how local replacement shares the frames (default: equal)")
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes for local replacement (default: 1)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed of the random policy")
+    args = parser.parse_args()
+
+    if args.frames < 1:
+        print("Frame number must be at least 1")
+        return
+
+    try:
+        trace = load_process_trace(args.tracefile, PAGE_OFFSET)
+    except FileNotFoundError:
+        print(f"Input '{args.tracefile}' could not be found")
+        return
+    except OSError as err:
+        print(f"Input '{args.tracefile}' could not be read: {err}")
+        return
+    except TraceFormatError as err:
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
+
+    if args.replacement == "global":
+        total = simulate_global(trace, args.mode, args.frames, args.seed)
+    else:
+        try:
+            (results, total) = simulate_local(trace, args.mode, args.frames, args.quota, args.jobs, args.seed)
+        except ValueError as err:
+            print(err)
+            return
+        for result in results:
+            print(f"pid {result.pid}: frames {result.frames} events {result.events} reads {result.reads} "
+                  f"writes {result.writes} fault rate {result.faults / result.events:.4f}")
+
+    no_events = total.events
+    print(f"total memory frames: {args.frames}")
+    print(f"events in trace: {no_events}")
+    print(f"total disk reads: {total.reads}")
+    print(f"total disk writes: {total.writes}")
+    print("page fault rate: ", end="")
+    print("{0:.4f}".format(total.faults / no_events if no_events else 0.0))
+
+if __name__ == "__main__":
+    main()
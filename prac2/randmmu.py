@@ -1,68 +1,112 @@
 from mmu import MMU
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
+from array import array
 import random
 
+VICTIM_BLOCK = 4096  # victim indices drawn at a time
+DEFAULT_SEED = 0
+
 class RandMMU(MMU):
-    def __init__(self, frames):
+    __slots__ = ('frames', 'frame_pages', 'dirty', 'dirty_pages', 'used', 'page_table', 'rng',
+                 'victims', 'next_victim', 'disk_reads', 'disk_writes',
+                 'page_faults', 'tracer')
+
+    def __init__(self, frames, seed=DEFAULT_SEED):
         self.frames = frames
-        self.page_table = {}  # Maps page number to its status ('R' for read, 'W' for written)
-        self.memory = []  # Represents frames in memory
+        self.rng = random.Random(seed)  # Private generator, so runs are reproducible and independent
+        self.victims = []  # Pre-drawn victim frame indices
+        self.next_victim = 0  # Index of the next unused entry of victims
+        self.frame_pages = array('q', [-1]) * frames  # Page held by each frame, -1 if free
+        self.dirty = bytearray(frames)  # Modified bit of each frame
+        self.dirty_pages = 0  # Number of frames whose modified bit is set
+        self.used = 0  # Number of frames holding a page
+        self.page_table = {}  # Maps page number to frame index in memory
         self.disk_reads = 0
         self.disk_writes = 0
         self.page_faults = 0
-        self.debug_mode = False
-
-    def set_debug(self):
-        self.debug_mode = True
-
-    def reset_debug(self):
-        self.debug_mode = False
+        self.tracer = None
 
     def read_memory(self, page_number):
         if page_number in self.page_table:
             # Page is already in memory, no action needed
-            if self.debug_mode:
-                print(f"Page {page_number} read from memory.")
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, self.page_table[page_number])
         else:
             # Page fault occurs
             self.page_faults += 1
-            self._handle_page_fault(page_number, mode='R')
+            self._handle_page_fault(page_number, dirty=False)
 
     def write_memory(self, page_number):
-        if page_number in self.page_table:
+        frame_index = self.page_table.get(page_number)
+        if frame_index is not None:
             # Page is already in memory, mark as modified
-            if self.debug_mode:
-                print(f"Page {page_number} written to memory.")
-            self.page_table[page_number] = 'W'  # Update page status to 'W'
+            if not self.dirty[frame_index]:
+                self.dirty[frame_index] = 1
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
         else:
             # Page fault occurs
             self.page_faults += 1
-            self._handle_page_fault(page_number, mode='W')
+            self._handle_page_fault(page_number, dirty=True)
 
-    def _handle_page_fault(self, page_number, mode):
-        if len(self.memory) < self.frames:
+    def access_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # Report every event to the tracer
+            return MMU.access_batch(self, pages, is_write)
+
+        page_table = self.page_table
+        dirty = self.dirty
+        for page_number, write in zip(pages, is_write):
+            frame_index = page_table.get(page_number)
+            if frame_index is not None:
+                # Hits only change the modified bit
+                if write and not dirty[frame_index]:
+                    dirty[frame_index] = 1
+                    self.dirty_pages += 1
+            else:
+                self.page_faults += 1
+                self._handle_page_fault(page_number, dirty=write)
+
+    def _draw_victim(self):
+        if self.next_victim == len(self.victims):
+            # Draw the next block of victims in one call
+            self.victims = self.rng.choices(range(self.frames), k=VICTIM_BLOCK)
+            self.next_victim = 0
+        victim = self.victims[self.next_victim]
+        self.next_victim += 1
+        return victim
+
+    def _handle_page_fault(self, page_number, dirty):
+        if self.used < self.frames:
             # There is still space in memory
-            self.memory.append(page_number)
-            self.page_table[page_number] = mode  # Set page mode ('R' or 'W')
-            replace_index = len(self.memory) - 1
+            replace_index = self.used
+            self.used += 1
         else:
             # No space, we need to replace a random page
-            replace_index = random.randint(0, self.frames - 1)
-            replaced_page = self.memory[replace_index]
+            replace_index = self._draw_victim()
+            replaced_page = self.frame_pages[replace_index]
 
             # If the replaced page was written to, we need to increment disk writes
-            if self.page_table[replaced_page] == 'W':
+            if self.dirty[replace_index]:
                 self.disk_writes += 1
 
-            # Replace the page in memory
-            self.memory[replace_index] = page_number
+            if self.tracer is not None:
+                self.tracer.record(EVICT, replaced_page, replace_index)
+                if self.dirty[replace_index]:
+                    self.tracer.record(WRITEBACK, replaced_page, replace_index)
             del self.page_table[replaced_page]
-            self.page_table[page_number] = mode  # Set page mode ('R' or 'W')
+
+        # Replace the page in memory
+        self.frame_pages[replace_index] = page_number
+        self.page_table[page_number] = replace_index
+        self.dirty_pages += dirty - self.dirty[replace_index]
+        self.dirty[replace_index] = dirty
 
         # Increment disk reads as we load the new page into memory
         self.disk_reads += 1
-
-        if self.debug_mode:
-            print(f"Page fault: loaded page {page_number} into frame {replace_index}")
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, replace_index)
 
     def get_total_disk_reads(self):
         return self.disk_reads
@@ -72,3 +116,93 @@ class RandMMU(MMU):
 
     def get_total_page_faults(self):
         return self.page_faults
+
+    def get_resident_dirty_pages(self):
+        return self.dirty_pages
+
+
+class DenseRandMMU(RandMMU):
+    '''RandMMU for traces renumbered by tracefile.densify(): page ids index
+    a flat list of frames instead of hashing into the page table dict.
+    '''
+    __slots__ = ('page_map', 'frame_of')
+
+    def __init__(self, frames, page_map, seed=DEFAULT_SEED):
+        RandMMU.__init__(self, frames, seed)
+        self.page_table = None  # Replaced by frame_of
+        self.page_map = page_map  # Page number of each page id
+        self.frame_of = [-1] * len(page_map)  # Frame index of each page id, -1 if not resident
+
+    def read_memory(self, page_number):
+        frame_index = self.frame_of[page_number]
+        if frame_index >= 0:
+            # Page is already in memory, no action needed
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=False)
+
+    def write_memory(self, page_number):
+        frame_index = self.frame_of[page_number]
+        if frame_index >= 0:
+            # Page is already in memory, mark as modified
+            if not self.dirty[frame_index]:
+                self.dirty[frame_index] = 1
+                self.dirty_pages += 1
+            if self.tracer is not None:
+                self.tracer.record(HIT, page_number, frame_index)
+        else:
+            # Page fault occurs
+            self.page_faults += 1
+            self._handle_page_fault(page_number, dirty=True)
+
+    def access_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # Report every event to the tracer
+            return MMU.access_batch(self, pages, is_write)
+
+        frame_of = self.frame_of
+        dirty = self.dirty
+        for page_id, write in zip(pages, is_write):
+            frame_index = frame_of[page_id]
+            if frame_index >= 0:
+                # Hits only change the modified bit
+                if write and not dirty[frame_index]:
+                    dirty[frame_index] = 1
+                    self.dirty_pages += 1
+            else:
+                self.page_faults += 1
+                self._handle_page_fault(page_id, dirty=write)
+
+    def _handle_page_fault(self, page_number, dirty):
+        if self.used < self.frames:
+            # There is still space in memory
+            replace_index = self.used
+            self.used += 1
+        else:
+            # No space, we need to replace a random page
+            replace_index = self._draw_victim()
+            replaced_page = self.frame_pages[replace_index]
+
+            # If the replaced page was written to, we need to increment disk writes
+            if self.dirty[replace_index]:
+                self.disk_writes += 1
+
+            if self.tracer is not None:
+                self.tracer.record(EVICT, replaced_page, replace_index)
+                if self.dirty[replace_index]:
+                    self.tracer.record(WRITEBACK, replaced_page, replace_index)
+            self.frame_of[replaced_page] = -1
+
+        # Replace the page in memory
+        self.frame_pages[replace_index] = page_number
+        self.frame_of[page_number] = replace_index
+        self.dirty_pages += dirty - self.dirty[replace_index]
+        self.dirty[replace_index] = dirty
+
+        # Increment disk reads as we load the new page into memory
+        self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, replace_index)
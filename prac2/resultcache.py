@@ -0,0 +1,90 @@
+'''
+* Content-addressed cache of simulation results.
+* A result is stored under the hash of everything it depends on: the
+* contents of the trace, the source of the modules that implement the
+* replacement mode (its MMU class and base classes) and of the modules every
+* result goes through (the trace parser and the simulation drivers), the
+* number of frames, the page size, the RNG seed and the warm-up length.
+* Editing one policy therefore only invalidates that policy's cells, a fix
+* to the parser or a driver invalidates them all, and a new frame count only
+* adds cells.
+*
+* Each entry is a small JSON file named after its key, written atomically,
+* so concurrent sweeps and interrupted runs never leave a broken entry.
+*
+'''
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+CACHE_VERSION = 1  # Bump to invalidate every entry when the stored fields change
+DEFAULT_CACHE_DIR = "result-cache"
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        while block := infile.read(HASH_BLOCK_BYTES):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    '''Results of (trace, MMU implementation, frames, page size, seed) cells.'''
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        self._file_hashes = {}  # Maps path to ((size, mtime), hash), so unchanged files are hashed once
+        self._source_hashes = {}  # Maps MMU class to the hash of its source
+
+    def trace_hash(self, path):
+        stat = os.stat(path)
+        version = (stat.st_size, stat.st_mtime_ns)
+        known = self._file_hashes.get(path)
+        if known is None or known[0] != version:
+            known = self._file_hashes[path] = (version, _hash_file(path))
+        return known[1]
+
+    def source_hash(self, mmu_class, extra_modules=()):
+        '''Hash of the modules defining mmu_class and its bases, and of extra_modules.'''
+        key = (mmu_class, tuple(extra_modules))
+        if key not in self._source_hashes:
+            modules = [sys.modules[cls.__module__] for cls in mmu_class.__mro__ if cls is not object]
+            modules.extend(extra_modules)
+            digest = hashlib.sha256()
+            for name in sorted({module.__name__ for module in modules}):
+                digest.update(name.encode())
+                digest.update(inspect.getsource(sys.modules[name]).encode())
+            self._source_hashes[key] = digest.hexdigest()
+        return self._source_hashes[key]
+
+    def key(self, trace_path, mmu_class, frames, page_offset, seed=None, warmup=0, extra_modules=()):
+        fields = [CACHE_VERSION, self.trace_hash(trace_path), self.source_hash(mmu_class, extra_modules),
+                  frames, page_offset, seed]
+        if warmup:
+            # Only added when used, so the keys of full runs stay the same
+            fields.append(warmup)
+        return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+    def _path(self, key):
+        # Spread the entries over subdirectories by the first byte of the key
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        '''The stored dict for key, or None if there is none (or it cannot be read).'''
+        try:
+            with open(self._path(key)) as infile:
+                return json.load(infile)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as outfile:
+            json.dump(value, outfile)
+        os.replace(tmp_path, path)
@@ -0,0 +1,264 @@
+'''
+* Approximate LRU miss ratio curves with SHARDS (Waldspurger et al., FAST 2015).
+* Page numbers are hashed, and only the accesses to pages whose hash falls
+* below a threshold T (out of HASH_RANGE) are simulated. A sample taken at
+* rate R = T / HASH_RANGE sees about R of the distinct pages, so a stack
+* distance d between sampled pages stands for a distance of 1 + (d - 1) / R
+* in the full trace, and each sampled access stands for 1 / R accesses.
+*
+* Two modes:
+*   rate        a fixed rate R; memory grows with R times the distinct pages.
+*   max_pages   at most max_pages sampled pages are tracked. When another
+*               one arrives, the page with the largest hash is dropped and T
+*               is lowered to that hash, so the rate falls as the trace
+*               reveals more pages and memory stays bounded.
+*
+* Distances are computed as in stackdist.py, with a Fenwick tree over access
+* slots, but the tree is compacted to the live pages whenever it fills up,
+* so it never holds more than about twice the tracked pages however long the
+* trace is. The trace is read in chunks, so streamed traces work too.
+*
+* Only the fault rate is estimated; dirty write-backs need the exact pass.
+*
+* Usage: python shards.py tracefile [--rate R | --max-pages N] [--max-exponent E] [--compare]
+'''
+import argparse
+import heapq
+from bisect import bisect_right
+from time import thread_time_ns
+
+from tracefile import PAGE_OFFSET, open_trace, TraceFormatError
+
+HASH_BITS = 24
+HASH_RANGE = 1 << HASH_BITS
+_MASK = (1 << 64) - 1
+MIN_CAPACITY = 1024  # smallest number of slots in the Fenwick tree
+DEFAULT_MAX_PAGES = 8192
+
+
+def page_hash(page_number):
+    '''Mix the page number (splitmix64 finaliser) and keep HASH_BITS bits.'''
+    h = (page_number * 0x9E3779B97F4A7C15) & _MASK
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & _MASK
+    return (h ^ (h >> 31)) >> (64 - HASH_BITS)
+
+
+class MissRatioCurve:
+    '''Estimated fault rate of LRU for any number of frames.'''
+
+    def __init__(self, events, distance_weights, cold_weight, total_weight, sampled_events, rate):
+        self.events = events
+        self.sampled_events = sampled_events
+        self.rate = rate  # Sampling rate at the end of the trace
+        self.total_weight = total_weight
+        self.cold_weight = cold_weight
+
+        # Hit weight with f frames = weight of distances <= f
+        self.distances = sorted(distance_weights)
+        self.hit_weights = []
+        running = 0.0
+        for distance in self.distances:
+            running += distance_weights[distance]
+            self.hit_weights.append(running)
+
+    def get_fault_rate(self, frames):
+        if frames < 1:
+            raise ValueError("Frame number must be at least 1")
+        if self.total_weight <= 0:
+            return 0.0
+        index = bisect_right(self.distances, frames)
+        hits = self.hit_weights[index - 1] if index else 0.0
+        fault_rate = 1.0 - hits / self.total_weight
+        return min(max(fault_rate, 0.0), 1.0)
+
+    def get_total_page_faults(self, frames):
+        return round(self.get_fault_rate(frames) * self.events)
+
+
+class _SampledStack:
+    '''LRU stack distances of the sampled pages, in memory bounded by them.'''
+
+    def __init__(self):
+        self.capacity = MIN_CAPACITY
+        self.tree = [0] * (self.capacity + 1)
+        self.last_slot = {}  # Maps sampled page to the slot of its most recent access
+        self.slot = 0
+        self.active = 0  # Number of pages with a 1 in the tree
+
+    def _add(self, slot, delta):
+        tree = self.tree
+        while slot <= self.capacity:
+            tree[slot] += delta
+            slot += slot & -slot
+
+    def _prefix(self, slot):
+        tree = self.tree
+        total = 0
+        while slot:
+            total += tree[slot]
+            slot &= slot - 1
+        return total
+
+    def _compact(self):
+        # Renumber the live pages 1..active in access order and rebuild the tree
+        self.capacity = max(MIN_CAPACITY, 2 * self.active)
+        order = sorted(self.last_slot, key=self.last_slot.get)
+        self.last_slot = {page: slot for (slot, page) in enumerate(order, 1)}
+        tree = [0] * (self.capacity + 1)
+        for slot in range(1, self.capacity + 1):
+            if slot <= self.active:
+                tree[slot] += 1
+            parent = slot + (slot & -slot)
+            if parent <= self.capacity:
+                tree[parent] += tree[slot]
+        self.tree = tree
+        self.slot = self.active
+
+    def access(self, page):
+        '''Record an access and return its stack distance, 0 for a first access.'''
+        previous = self.last_slot.pop(page, None)
+        if previous is None:
+            distance = 0
+        else:
+            distance = self.active - self._prefix(previous) + 1
+            self._add(previous, -1)
+            self.active -= 1
+
+        if self.slot == self.capacity:
+            self._compact()
+        self.slot += 1
+        self._add(self.slot, 1)
+        self.last_slot[page] = self.slot
+        self.active += 1
+        return distance
+
+    def remove(self, page):
+        self._add(self.last_slot.pop(page), -1)
+        self.active -= 1
+
+
+def shards_curve(chunks, rate=None, max_pages=None):
+    '''Estimate the LRU miss ratio curve of a trace given as (pages, writes) chunks.
+    Give either a sampling rate in (0, 1] or a maximum number of sampled pages.
+    '''
+    if (rate is None) == (max_pages is None):
+        raise ValueError("Give either a sampling rate or a maximum number of sampled pages")
+    if rate is not None and not 0 < rate <= 1:
+        raise ValueError("Sampling rate must be in (0, 1]")
+    if max_pages is not None and max_pages < 1:
+        raise ValueError("The sample must hold at least one page")
+
+    threshold = HASH_RANGE if max_pages is not None else max(1, round(rate * HASH_RANGE))
+    stack = _SampledStack()
+    heap = []  # (-hash, page) of the tracked pages, when the sample size is fixed
+    hashes = {}  # Maps page number to its hash, for pages recently seen
+    distance_weights = {}
+    cold_weight = 0.0
+    total_weight = 0.0
+    events = 0
+    sampled_events = 0
+
+    for (pages, _) in chunks:
+        events += len(pages)
+        for page in pages:
+            h = hashes.get(page)
+            if h is None:
+                h = page_hash(page)
+                if len(hashes) >= MIN_CAPACITY * 64:
+                    hashes.clear()  # Keep the memo bounded
+                hashes[page] = h
+            if h >= threshold:
+                continue
+
+            sampled_events += 1
+            weight = HASH_RANGE / threshold
+            total_weight += weight
+            distance = stack.access(page)
+            if distance == 0:
+                cold_weight += weight
+                if max_pages is not None:
+                    heapq.heappush(heap, (-h, page))
+                    while stack.active > max_pages:
+                        # Drop the pages with the largest hash and lower the threshold to it
+                        (top, _) = heap[0]
+                        threshold = -top
+                        while heap and heap[0][0] == top:
+                            (_, dropped) = heapq.heappop(heap)
+                            stack.remove(dropped)
+            else:
+                # The page itself is always there; only the distinct pages
+                # in between were sampled, about one in 1 / rate of them
+                scaled = 1 + round((distance - 1) * HASH_RANGE / threshold)
+                distance_weights[scaled] = distance_weights.get(scaled, 0.0) + weight
+
+    final_rate = threshold / HASH_RANGE
+    if max_pages is None and events:
+        # SHARDS_adj: the sample got more or fewer accesses than expected.
+        # Correct the difference at the smallest distance, where it
+        # changes the hits of every frame count alike.
+        adjustment = events - total_weight
+        distance_weights[1] = distance_weights.get(1, 0.0) + adjustment
+        total_weight = float(events)
+
+    return MissRatioCurve(events, distance_weights, cold_weight, total_weight, sampled_events, final_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the LRU fault rate for every frame count with SHARDS")
+    parser.add_argument("tracefile")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--rate", type=float, help="fixed sampling rate in (0, 1]")
+    group.add_argument("--max-pages", type=int, help=f"track at most this many sampled pages (default: {DEFAULT_MAX_PAGES})")
+    parser.add_argument("--max-exponent", type=int, default=12, help="largest frame count is 2**max_exponent (default: 12)")
+    parser.add_argument("--compare", action="store_true", help="also run the exact stack distance pass and report the error")
+    args = parser.parse_args()
+    max_pages = args.max_pages if args.rate is not None or args.max_pages is not None else DEFAULT_MAX_PAGES
+
+    try:
+        trace = open_trace(args.tracefile, PAGE_OFFSET)
+        start = thread_time_ns()
+        curve = shards_curve(trace.chunks(), args.rate, max_pages)
+        elapsed = (thread_time_ns() - start) / 10**9
+    except FileNotFoundError:
+        print(f"Input '{args.tracefile}' could not be found")
+        return
+    except (OSError, EOFError):
+        print(f"Input '{args.tracefile}' could not be read")
+        return
+    except TraceFormatError as err:
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
+    except ValueError as err:
+        print(err)
+        return
+
+    print(f"events: {curve.events} sampled: {curve.sampled_events} final rate: {curve.rate:.6f} time: {elapsed}s")
+
+    profile = None
+    if args.compare:
+        if not hasattr(trace, "pages"):
+            print("--compare needs a trace that can be loaded whole")
+            return
+        from stackdist import lru_stack_distances
+        start = thread_time_ns()
+        profile = lru_stack_distances(trace.pages, trace.writes)
+        print(f"exact pass time: {(thread_time_ns() - start) / 10**9}s")
+
+    frames_list = [2 ** x for x in range(0, args.max_exponent + 1)]
+    errors = []
+    for frames in frames_list:
+        estimate = curve.get_fault_rate(frames)
+        if profile is None:
+            print(f"{frames},{estimate}")
+            continue
+        exact = profile.get_total_page_faults(frames) / profile.events
+        errors.append(abs(estimate - exact))
+        print(f"{frames},{estimate},{exact},{estimate - exact}")
+
+    if errors:
+        print(f"mean absolute error: {sum(errors) / len(errors)}")
+        print(f"max absolute error: {max(errors)}")
+
+if __name__ == "__main__":
+    main()
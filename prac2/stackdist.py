@@ -0,0 +1,146 @@
+'''
+* Single pass LRU simulation for every frame count (Mattson et al.).
+* LRU is a stack algorithm: with f frames the resident pages are always the
+* f most recently used ones, so an access hits exactly when its stack
+* distance (1 + number of distinct pages used since the previous access to
+* the same page) is at most f. One pass over the trace therefore gives the
+* page faults of LruMMU for every frame count.
+*
+* Stack distances are computed with a Fenwick tree over access slots, which
+* holds a 1 at the most recent slot of every page, so each event costs
+* O(log n) instead of O(frames).
+*
+* Dirty evictions are derived from the same distances. With f frames the
+* page is evicted after an access exactly when the distance of its next
+* access (or its depth at the end of the trace) is greater than f, and it is
+* dirty when its last write happened in the current residency, i.e. when no
+* access since that write had a distance greater than f. Each access thus
+* adds one dirty eviction to a contiguous range of frame counts.
+*
+'''
+
+
+class StackDistanceProfile:
+    def __init__(self, events, cold_misses, distance_counts, dirty_evictions):
+        self.events = events
+        self.cold_misses = cold_misses
+        self.distinct_pages = len(distance_counts) - 1
+
+        # Hits with f frames = accesses with distance <= f
+        self.hits = [0] * len(distance_counts)
+        running = 0
+        for distance, count in enumerate(distance_counts):
+            running += count
+            self.hits[distance] = running
+
+        # Dirty evictions per frame count, from the range updates
+        self.dirty = [0] * len(dirty_evictions)
+        running = 0
+        for frames, delta in enumerate(dirty_evictions):
+            running += delta
+            self.dirty[frames] = running
+
+    def _clamp(self, frames):
+        if frames < 1:
+            raise ValueError("Frame number must be at least 1")
+        return min(frames, self.distinct_pages)
+
+    def get_total_page_faults(self, frames):
+        return self.events - self.hits[self._clamp(frames)]
+
+    def get_total_disk_reads(self, frames):
+        # Every page fault loads the page from disk
+        return self.get_total_page_faults(frames)
+
+    def get_total_disk_writes(self, frames):
+        return self.dirty[self._clamp(frames)]
+
+
+def lru_stack_distances(pages, writes):
+    '''Run LRU over a trace once and return its StackDistanceProfile.'''
+    events = len(pages)
+    # Back-to-back accesses to the same page share a slot, so there
+    # are at most events slots and at most events distinct pages
+    tree = [0] * (events + 1)
+    distance_counts = [0] * (events + 1)
+    dirty_evictions = [0] * (events + 2)
+
+    last_slot = {}    # page -> slot of its most recent access
+    since_write = {}  # page -> largest distance since its last write, -1 if never written
+    cold_misses = 0
+    active = 0        # number of distinct pages seen so far
+    slot = 0
+    prev_page = None
+
+    for page, is_write in zip(pages, writes):
+        if page == prev_page:
+            # Distance 1: a hit for every frame count and no eviction range
+            distance_counts[1] += 1
+            if is_write:
+                since_write[page] = 0
+            continue
+        prev_page = page
+        slot += 1
+
+        previous = last_slot.get(page)
+        if previous is None:
+            cold_misses += 1
+            active += 1
+            since_write[page] = 0 if is_write else -1
+        else:
+            # Pages whose latest slot is after the previous access to this page
+            i = previous
+            before = 0
+            while i:
+                before += tree[i]
+                i &= i - 1
+            distance = active - before + 1
+            distance_counts[distance] += 1
+
+            i = previous
+            while i <= events:
+                tree[i] -= 1
+                i += i & -i
+
+            # The previous residency ends for frame counts below distance
+            last_write = since_write[page]
+            if last_write >= 0:
+                low = last_write if last_write > 1 else 1
+                if low < distance:
+                    dirty_evictions[low] += 1
+                    dirty_evictions[distance] -= 1
+
+            if is_write:
+                since_write[page] = 0
+            elif last_write >= 0 and distance > last_write:
+                since_write[page] = distance
+
+        i = slot
+        while i <= events:
+            tree[i] += 1
+            i += i & -i
+        last_slot[page] = slot
+
+    # Pages still dirty at the end are written back only if they were
+    # pushed below the frame count by later accesses
+    for page, previous in last_slot.items():
+        last_write = since_write[page]
+        if last_write < 0:
+            continue
+        i = previous
+        before = 0
+        while i:
+            before += tree[i]
+            i &= i - 1
+        depth = active - before + 1
+        low = last_write if last_write > 1 else 1
+        if low < depth:
+            dirty_evictions[low] += 1
+            dirty_evictions[depth] -= 1
+
+    return StackDistanceProfile(
+        events,
+        cold_misses,
+        distance_counts[:active + 1],
+        dirty_evictions[:active + 1]
+    )
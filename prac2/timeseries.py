@@ -0,0 +1,127 @@
+'''
+* Windowed time series of an MMU's counters.
+* WindowRecorder feeds chunks of events to an MMU, cutting them at every
+* multiple of the window size, and after each window writes one CSV line
+* with the faults, disk reads and disk writes of that window and the number
+* of resident dirty pages at its end. Only the counters at the start of the
+* current window are kept, so memory is constant and the MMU still runs its
+* access_batch fast path; the extra cost is one line per window.
+*
+* Usage: python timeseries.py tracefile frames mode window [--out FILE]
+'''
+import argparse
+import sys
+
+WINDOW_HEADER = "window,first_event,events,faults,reads,writes,fault_rate,resident_dirty\n"
+
+
+class WindowRecorder:
+    def __init__(self, mmu, window, out=None):
+        if window < 1:
+            raise ValueError("Window must hold at least one event")
+        self.mmu = mmu
+        self.window = window
+        self.out = out if out is not None else sys.stdout
+        self.index = 0  # Number of the current window
+        self.first_event = 0  # Index of the first event of the current window
+        self.events = 0  # Events of the current window so far
+        self.start = self._counters()  # Counters at the start of the current window
+
+    def _counters(self):
+        mmu = self.mmu
+        return (mmu.get_total_page_faults(), mmu.get_total_disk_reads(), mmu.get_total_disk_writes())
+
+    def write_header(self):
+        self.out.write(WINDOW_HEADER)
+
+    def access_batch(self, pages, is_write):
+        '''Same as mmu.access_batch, writing a line whenever a window is complete.'''
+        position = 0
+        while position < len(pages):
+            take = min(self.window - self.events, len(pages) - position)
+            if position == 0 and take == len(pages):
+                self.mmu.access_batch(pages, is_write)
+            else:
+                self.mmu.access_batch(pages[position:position + take], is_write[position:position + take])
+            position += take
+            self.events += take
+            if self.events == self.window:
+                self._emit()
+
+    def _emit(self):
+        now = self._counters()
+        (faults, reads, writes) = (after - before for (after, before) in zip(now, self.start))
+        self.out.write(f"{self.index},{self.first_event},{self.events},{faults},{reads},{writes},"
+                       f"{faults / self.events},{self.mmu.get_resident_dirty_pages()}\n")
+        self.index += 1
+        self.first_event += self.events
+        self.events = 0
+        self.start = now
+
+    def finish(self):
+        # Write the last, partial window
+        if self.events:
+            self._emit()
+        self.out.flush()
+
+
+def main():
+    from evaluate import ReplacementMMU, create_mmu
+    from optmmu import OptMMU, next_use_index
+    from tracefile import PAGE_OFFSET, TraceStream, TraceFormatError, open_trace
+
+    modes = {x.name: x for x in ReplacementMMU}
+    modes["2q"] = modes.pop("twoq")
+    parser = argparse.ArgumentParser(description="Write per-window fault, read and write counts of one simulation")
+    parser.add_argument("tracefile")
+    parser.add_argument("frames", type=int)
+    parser.add_argument("mode", choices=list(modes))
+    parser.add_argument("window", type=int, help="events per window")
+    parser.add_argument("--out", help="write the series to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.frames < 1:
+        print("Frame number must be at least 1")
+        return
+    if args.window < 1:
+        print("Window must hold at least one event")
+        return
+
+    try:
+        trace = open_trace(args.tracefile, PAGE_OFFSET)
+    except FileNotFoundError:
+        print(f"Input '{args.tracefile}' could not be found")
+        return
+    except (OSError, EOFError):
+        print(f"Input '{args.tracefile}' could not be read")
+        return
+    except TraceFormatError as err:
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
+
+    mode = modes[args.mode]
+    if mode is ReplacementMMU.opt:
+        # OPT looks ahead, so it needs the whole trace up front
+        if isinstance(trace, TraceStream):
+            print("Replacement mode opt cannot be used with a compressed or stdin trace")
+            return
+        mmu = OptMMU(args.frames, next_use_index(trace.pages))
+    else:
+        mmu = create_mmu(mode, args.frames, args.tracefile)
+
+    out = open(args.out, "w") if args.out else None
+    try:
+        recorder = WindowRecorder(mmu, args.window, out)
+        recorder.write_header()
+        for pages, writes in trace.chunks():
+            recorder.access_batch(pages, writes)
+        recorder.finish()
+    except TraceFormatError as err:
+        # Only streamed traces are parsed while simulating
+        print(f"Badly formatted file. Error on line {err.line_number}")
+    finally:
+        if out is not None:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+'''
+* Compiled trace format.
+* Parsing the text traces ("0041f7a0 R" per line) is as expensive as
+* simulating them, so a trace is converted once into a compact binary file
+* stored next to it (bzip.trace -> bzip.tracec) and reused on later runs.
+*
+* Traces made only of fixed width lines (8 hex digits, a space, R or W and
+* a newline) are decoded by memory-mapping the file and working on whole
+* columns of the byte buffer at once; any other layout falls back to the
+* line by line parser, which reports the line number of bad input.
+*
+* Compressed traces (.gz, .bz2, .xz) and stdin ("-") cannot be compiled
+* ahead of time, so they are streamed instead: TraceStream parses them in
+* large buffered blocks and hands out chunks, keeping memory bounded
+* whatever the size of the trace.
+*
+* densify() renumbers the pages of a loaded trace to dense ids 0..P-1 and
+* keeps the mapping back to page numbers, for the array-based MMUs.
+* shift_pages() turns a trace into one with larger pages without parsing it
+* again.
+*
+* Layout of a compiled trace (little endian):
+*   header  magic, version, page offset, page item size, event count,
+*           size and mtime of the source trace (used to detect stale files)
+*   pages   event count page numbers, unsigned, item size bytes each
+*   flags   read/write flags packed 8 events per byte, bit set for a write
+*
+'''
+import binascii
+import bz2
+import gzip
+import lzma
+import mmap
+import os
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, replace
+from itertools import repeat
+from operator import rshift
+
+PAGE_OFFSET = 12  # page is 2^12 = 4KB
+
+MAGIC = b'MTRC'
+VERSION = 1
+HEADER = struct.Struct('<4sHBBQQq')
+COMPILED_SUFFIX = 'c'
+CHUNK_EVENTS = 1 << 16  # events handed to MMU.access_batch at a time
+STREAM_BLOCK_BYTES = 1 << 20  # bytes parsed at a time when streaming
+
+LINE_WIDTH = 11  # "0041f7a0 R\n"
+FIXED_BLOCK_LINES = 1 << 20  # lines decoded at a time by the fixed width parser
+_OP_FLAGS = bytes.maketrans(b'RW', b'\x00\x01')
+
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+# Lookup tables between one packed flag byte and eight 0/1 flag bytes
+_UNPACK = [bytes((value >> bit) & 1 for bit in range(8)) for value in range(256)]
+_PACK = {flags: value for value, flags in enumerate(_UNPACK)}
+
+
+class TraceFormatError(ValueError):
+    def __init__(self, line_number):
+        super().__init__(f"Badly formatted file. Error on line {line_number}")
+        self.line_number = line_number
+
+
+@dataclass
+class Trace:
+    pages: array        # page number of every event
+    writes: bytearray   # 1 if the event is a write, 0 if it is a read
+    page_offset: int
+    page_map: array = None  # original page number of each dense page id, if pages holds ids
+    counts: array = None    # events merged into each entry, if the trace was compacted
+
+    def __len__(self):
+        return len(self.pages)
+
+    def event_count(self):
+        # Events of the original trace, which a compacted trace has fewer entries than
+        return len(self.pages) if self.counts is None else sum(self.counts)
+
+    def chunks(self, chunk_events=CHUNK_EVENTS, first=0, last=None):
+        # Yields (pages, writes) slices of events first..last-1 for MMU.access_batch
+        if last is None or last > len(self.pages):
+            last = len(self.pages)
+        for start in range(first, last, chunk_events):
+            end = min(start + chunk_events, last)
+            yield self.pages[start:end].tolist(), self.writes[start:end]
+
+
+def densify(trace):
+    '''Return the trace with its pages renumbered 0..P-1 in order of first use.
+    page_map[id] gives back the original page number, so MMUs can index flat
+    arrays by id and still report real page numbers.
+    '''
+    ids = {}
+    setdefault = ids.setdefault
+    # Each new page gets the next id, the number of pages seen before it
+    dense = array('I', [setdefault(page, len(ids)) for page in trace.pages])
+    page_map = array('Q', ids)
+    return replace(trace, pages=dense, page_map=page_map)
+
+
+def shift_pages(trace, page_offset):
+    '''Return the trace with pages of 2**page_offset bytes, which must be no
+    smaller than its own: page numbers are shifted right by the difference,
+    so no line is decoded again.
+    '''
+    if page_offset < trace.page_offset:
+        raise ValueError(f"Pages of 2**{page_offset} bytes cannot be made from pages of 2**{trace.page_offset}")
+    if page_offset == trace.page_offset:
+        return trace
+    shift = page_offset - trace.page_offset
+    pages = array(trace.pages.typecode, map(rshift, trace.pages, repeat(shift)))
+    return Trace(pages, trace.writes, page_offset)
+
+
+def compiled_path(path):
+    return path + COMPILED_SUFFIX
+
+
+def parse_lines(lines, line_number, page_offset, pages, writes):
+    '''Parse trace lines (bytes), appending to pages and writes.
+    line_number is the number of the first line, used in errors.
+    '''
+    for trace_line in lines:
+        trace_cmd = trace_line.strip().split(b" ")
+        try:
+            logical_address = int(trace_cmd[0], 16)
+        except ValueError:
+            raise TraceFormatError(line_number) from None
+        operation = trace_cmd[1] if len(trace_cmd) > 1 else None
+        if operation == b"R":
+            writes.append(0)
+        elif operation == b"W":
+            writes.append(1)
+        else:
+            raise TraceFormatError(line_number)
+        pages.append(logical_address >> page_offset)
+        line_number += 1
+
+
+def read_blocks(infile, block_bytes=STREAM_BLOCK_BYTES):
+    '''Yield lists of complete lines read from a binary file, one block at a time.'''
+    remainder = b''
+    while True:
+        block = infile.read(block_bytes)
+        if not block:
+            break
+        lines = (remainder + block).split(b'\n')
+        remainder = lines.pop()
+        if lines:
+            yield lines
+    if remainder:
+        yield [remainder]
+
+
+def parse_fixed_width(path, page_offset=PAGE_OFFSET):
+    '''Decode a trace of fixed width lines without creating per-line objects.
+    Returns None if any line does not follow the fixed width layout.
+    '''
+    if array('I').itemsize != 4:
+        return None
+
+    with open(path, 'rb') as trace_file:
+        size = os.fstat(trace_file.fileno()).st_size
+        # The last line may lack its newline
+        events = (size + 1) // LINE_WIDTH
+        if size == 0 or size not in (events * LINE_WIDTH, events * LINE_WIDTH - 1):
+            return None
+
+        pages = array('I')
+        writes = bytearray()
+        with mmap.mmap(trace_file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for first in range(0, events, FIXED_BLOCK_LINES):
+                lines = min(FIXED_BLOCK_LINES, events - first)
+                start = first * LINE_WIDTH
+                end = min(start + lines * LINE_WIDTH, size)
+
+                # Check the separator columns and the operations
+                if buf[start + 8:end:LINE_WIDTH] != b' ' * lines:
+                    return None
+                newlines = buf[start + 10:end:LINE_WIDTH]
+                if newlines != b'\n' * len(newlines):
+                    return None
+                operations = buf[start + 9:end:LINE_WIDTH]
+                if operations.translate(None, b'RW'):
+                    return None
+
+                # Dropping the separators and operations leaves the hex digits
+                digits = buf[start:end].translate(None, b' RW\n')
+                if len(digits) != 8 * lines:
+                    return None
+                try:
+                    addresses = array('I', binascii.a2b_hex(digits))
+                except binascii.Error:
+                    return None
+                if sys.byteorder == 'little':
+                    addresses.byteswap()
+
+                pages.extend(map(rshift, addresses, repeat(page_offset)))
+                writes += operations.translate(_OP_FLAGS)
+
+    return Trace(pages, writes, page_offset)
+
+
+def parse_text_trace(path, page_offset=PAGE_OFFSET):
+    '''Parse a whole text trace into a Trace.'''
+    trace = parse_fixed_width(path, page_offset)
+    if trace is not None:
+        return trace
+
+    pages = array('Q')
+    writes = bytearray()
+    with open(path, 'rb') as trace_file:
+        for lines in read_blocks(trace_file):
+            parse_lines(lines, len(writes) + 1, page_offset, pages, writes)
+    return Trace(_narrow(pages), writes, page_offset)
+
+
+def is_streamed(path):
+    return path == '-' or os.path.splitext(path)[1] in COMPRESSED_OPENERS
+
+
+class TraceStream:
+    '''A trace read once from stdin or a compressed file.
+    The file is opened straight away, so a missing trace raises
+    FileNotFoundError here; badly formatted lines raise TraceFormatError
+    while iterating over chunks().
+    '''
+
+    def __init__(self, path, page_offset=PAGE_OFFSET, block_bytes=STREAM_BLOCK_BYTES):
+        self.page_offset = page_offset
+        self.block_bytes = block_bytes
+        self.events = 0
+        if path == '-':
+            self.infile = sys.stdin.buffer
+        else:
+            self.infile = COMPRESSED_OPENERS[os.path.splitext(path)[1]](path, 'rb')
+            self.infile.peek(1)  # Fail early on a file that is not compressed
+
+    def __len__(self):
+        # Number of events read so far
+        return self.events
+
+    def chunks(self):
+        try:
+            for lines in read_blocks(self.infile, self.block_bytes):
+                pages = []
+                writes = bytearray()
+                parse_lines(lines, self.events + 1, self.page_offset, pages, writes)
+                self.events += len(writes)
+                yield pages, writes
+        finally:
+            if self.infile is not sys.stdin.buffer:
+                self.infile.close()
+
+
+def _narrow(pages):
+    # Use 4 byte items unless a page number does not fit
+    if pages and max(pages) > 0xFFFFFFFF:
+        return pages
+    return array('I', pages)
+
+
+def pack_flags(writes):
+    padded = bytes(writes) + bytes(-len(writes) % 8)
+    return bytes(_PACK[padded[i:i + 8]] for i in range(0, len(padded), 8))
+
+
+def unpack_flags(packed, events):
+    return bytearray(b''.join(map(_UNPACK.__getitem__, packed))[:events])
+
+
+def write_compiled(trace, path, source_stat=None):
+    pages = trace.pages
+    if sys.byteorder != 'little':
+        pages = array(pages.typecode, pages)
+        pages.byteswap()
+    size, mtime = (source_stat.st_size, source_stat.st_mtime_ns) if source_stat else (0, 0)
+    header = HEADER.pack(MAGIC, VERSION, trace.page_offset, pages.itemsize,
+                         len(trace), size, mtime)
+
+    # Write to a temporary file first so a concurrent reader never sees a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(header)
+        pages.tofile(out)
+        out.write(pack_flags(trace.writes))
+    os.replace(tmp_path, path)
+
+
+def read_compiled(path, source_stat=None):
+    '''Read a compiled trace, returning None if it is missing, stale or invalid.'''
+    try:
+        with open(path, 'rb') as infile:
+            data = infile.read()
+    except OSError:
+        return None
+
+    if len(data) < HEADER.size:
+        return None
+    magic, version, page_offset, item_size, events, size, mtime = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    if source_stat and (size, mtime) != (source_stat.st_size, source_stat.st_mtime_ns):
+        return None
+
+    typecode = {4: 'I', 8: 'Q'}.get(item_size)
+    flags_start = HEADER.size + events * item_size
+    if typecode is None or len(data) != flags_start + (events + 7) // 8:
+        return None
+
+    pages = array(typecode)
+    pages.frombytes(data[HEADER.size:flags_start])
+    if sys.byteorder != 'little':
+        pages.byteswap()
+    writes = unpack_flags(data[flags_start:], events)
+    return Trace(pages, writes, page_offset)
+
+
+def compile_trace(path, page_offset=PAGE_OFFSET):
+    '''Convert a text trace and store the compiled file next to it.'''
+    source_stat = os.stat(path)
+    trace = parse_text_trace(path, page_offset)
+    try:
+        write_compiled(trace, compiled_path(path), source_stat)
+    except OSError:
+        pass  # Read-only location, the trace is still usable
+    return trace
+
+
+def load_trace(path, page_offset=PAGE_OFFSET):
+    '''Load a trace, building or reusing its compiled file.
+    Raises FileNotFoundError if the trace does not exist and
+    TraceFormatError if it is badly formatted.
+    '''
+    source_stat = os.stat(path)
+    trace = read_compiled(compiled_path(path), source_stat)
+    if trace is not None and trace.page_offset == page_offset:
+        return trace
+    return compile_trace(path, page_offset)
+
+
+def open_trace(path, page_offset=PAGE_OFFSET):
+    '''Open a trace for simulation: plain traces are loaded through their
+    compiled file, compressed traces and stdin are streamed.
+    '''
+    if is_streamed(path):
+        return TraceStream(path, page_offset)
+    return load_trace(path, page_offset)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python tracefile.py tracefile [tracefile ...]")
+        return
+
+    for path in sys.argv[1:]:
+        try:
+            trace = compile_trace(path)
+        except FileNotFoundError:
+            print(f"Input '{path}' could not be found")
+            continue
+        except TraceFormatError as err:
+            print(f"{path}: {err}")
+            continue
+        print(f"{path} -> {compiled_path(path)}: {len(trace)} events")
+
+if __name__ == "__main__":
+    main()
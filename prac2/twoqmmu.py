@@ -0,0 +1,117 @@
+'''
+* Full 2Q replacement (Johnson and Shasha, VLDB 1994).
+* A page seen for the first time enters A1in, a FIFO of about a quarter of
+* the frames; hits there do not promote it. When it leaves A1in only its
+* number is remembered in A1out (a ghost FIFO of about half the frame
+* count). A fault on a page found in A1out shows real reuse, so the page
+* goes to Am, which is managed as LRU. A single sequential scan therefore
+* only cycles through A1in and never flushes Am.
+*
+* A1in, A1out and Am are OrderedDicts, so every access is O(1). Only the
+* eviction of a resident page costs a disk write.
+*
+'''
+from mmu import MMU
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
+from collections import OrderedDict
+
+class TwoQMMU(MMU):
+    __slots__ = ('frames', 'kin', 'kout', 'a1in', 'a1out', 'am', 'dirty', 'dirty_pages', 'used',
+                 'disk_reads', 'disk_writes', 'page_faults', 'tracer')
+
+    def __init__(self, frames, kin=None, kout=None):
+        self.frames = frames
+        self.kin = kin if kin is not None else max(1, frames // 4)  # Target size of A1in
+        self.kout = kout if kout is not None else max(1, frames // 2)  # Size of A1out
+        self.a1in = OrderedDict()  # Resident pages seen once, oldest first, page number -> frame index
+        self.a1out = OrderedDict()  # Ghosts of pages dropped from A1in, oldest first
+        self.am = OrderedDict()  # Resident pages with reuse, LRU first, page number -> frame index
+        self.dirty = bytearray(frames)  # Modified bit of each frame
+        self.dirty_pages = 0  # Number of frames whose modified bit is set
+        self.used = 0  # Number of frames holding a page
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.tracer = None
+
+    def read_memory(self, page_number):
+        self._access(page_number, 0)
+
+    def write_memory(self, page_number):
+        self._access(page_number, 1)
+
+    def _access(self, page_number, write):
+        frame_index = self.am.get(page_number)
+        if frame_index is not None:
+            self.am.move_to_end(page_number)
+        else:
+            frame_index = self.a1in.get(page_number)
+            if frame_index is None:
+                # Page fault occurs
+                self.page_faults += 1
+                self._handle_page_fault(page_number, dirty=write)
+                return
+            # Hits in A1in leave it in place
+
+        if write and not self.dirty[frame_index]:
+            self.dirty[frame_index] = 1
+            self.dirty_pages += 1
+        if self.tracer is not None:
+            self.tracer.record(HIT, page_number, frame_index)
+
+    def _reclaim_frame(self):
+        if self.used < self.frames:
+            # There is still space in memory
+            frame_index = self.used
+            self.used += 1
+            return frame_index
+
+        if len(self.a1in) > self.kin or not self.am:
+            # Drop the oldest page of A1in, remembering it in A1out
+            replaced_page, frame_index = self.a1in.popitem(last=False)
+            self.a1out[replaced_page] = None
+            if len(self.a1out) > self.kout:
+                self.a1out.popitem(last=False)
+        else:
+            replaced_page, frame_index = self.am.popitem(last=False)
+
+        # If the replaced page was written to, we need to increment disk writes
+        if self.dirty[frame_index]:
+            self.disk_writes += 1
+
+        if self.tracer is not None:
+            self.tracer.record(EVICT, replaced_page, frame_index)
+            if self.dirty[frame_index]:
+                self.tracer.record(WRITEBACK, replaced_page, frame_index)
+        return frame_index
+
+    def _handle_page_fault(self, page_number, dirty):
+        # Look in A1out before reclaiming, which may push ghosts out of it
+        reused = page_number in self.a1out
+        if reused:
+            del self.a1out[page_number]
+        frame_index = self._reclaim_frame()
+        if reused:
+            # Reused after leaving A1in
+            self.am[page_number] = frame_index
+        else:
+            self.a1in[page_number] = frame_index
+        self.dirty_pages += dirty - self.dirty[frame_index]
+        self.dirty[frame_index] = dirty
+
+        # Increment disk reads as we load the new page into memory
+        self.disk_reads += 1
+        if self.tracer is not None:
+            self.tracer.record(FAULT, page_number, frame_index)
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+    def get_resident_dirty_pages(self):
+        return self.dirty_pages
@@ -1,123 +1,201 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+'''
+* Plots of a sweep's output.csv, written under plots/.
+* For every replacement mode and every trace (and every page size, if the
+* sweep has several) the fault rate, the disk accesses and the time are
+* plotted against the number of frames.
+*
+* Plots are rendered off-screen in worker processes. A manifest in the plot
+* directory keeps the hash of the rows and columns each plot was drawn from,
+* plus the source of this module, so a run only redraws the plots whose
+* input changed or whose file is missing.
+*
+* Usage: python visualisations.py [--input FILE] [--out-dir DIR] [--jobs N] [--force]
+'''
+import argparse
+import hashlib
+import inspect
+import json
 import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-# Load the CSV file
-df = pd.read_csv('output.csv')
-df['disk_accesses'] = df['reads'] + df['writes']
-df['disk_accesses_log'] = df['disk_accesses'].apply(lambda x: math.log(x, 10))
-df['fault_rate_log'] = df['fault_rate'].apply(lambda x: math.log(x, 2))
-df['frames_log'] = df['frames'].apply(lambda x: math.log(x, 2))
-
-# Display the first few rows of the dataframe
-print(df.head())
+import matplotlib
+matplotlib.use("Agg")  # Only files are written, no window is opened
+import matplotlib.pyplot as plt
+import pandas as pd
 
-# Assuming the CSV file has columns like 'mmu', 'trace', 'frames', 'fault_rate', 'reads', and 'writes'
+DEFAULT_PAGE_SIZE = 4096  # Sweeps without a page_size column used 4 KiB pages
+MANIFEST_NAME = "plot-manifest.json"
 
-# Plot 1: Page Fault Rate vs. Number of Frames for each algorithm
+# Plot kind -> (column plotted, title, y axis label)
+PLOTS = {
+    "fault_rate_vs_frames": ("fault_rate_log", "Page Fault Rate", "Page Fault Rate (log2)"),
+    "disk_accesses_vs_frames": ("disk_accesses_log", "Disk Accesses (Reads + Writes)",
+                                "Disk Accesses (Reads + Writes) (log10)"),
+    "time_vs_frames": ("time_sec", "System Cost", "Time (sec)"),
+}
 
-def plot_fault_rate(subset: pd.DataFrame, label: str, show: bool = False):
-    traces = sorted(subset['trace'].unique())
-    mmus = sorted(set(subset['mmu']))
 
-    traces_dep = None
+def load_results(path):
+    df = pd.read_csv(path)
+    if 'page_size' not in df.columns:
+        df['page_size'] = DEFAULT_PAGE_SIZE
+    df['disk_accesses'] = df['reads'] + df['writes']
+    df['disk_accesses_log'] = df['disk_accesses'].apply(lambda x: _log(x, 10))
+    df['fault_rate_log'] = df['fault_rate'].apply(lambda x: _log(x, 2))
+    df['frames_log'] = df['frames'].apply(lambda x: math.log(x, 2))
+    return df
 
-    if len(traces) == 1:
-        traces_dep = True
-    if len(mmus) == 1:
-        traces_dep = False
 
-    plt.figure(figsize=(10, 6))
-    if traces_dep:
-        for mmu in mmus:
-            subset2 = subset[subset['mmu'] == mmu]
-            print(subset2.to_string())
-            plt.plot(subset2['frames_log'], subset2['fault_rate_log'], marker='o', label=mmu)
-    else:
-        for trace in traces:
-            subset2 = subset[subset['trace'] == trace]
-            print(subset2.to_string())
-            plt.plot(subset2['frames_log'], subset2['fault_rate_log'], marker='o', label=trace)
-
-    plt.title(f'Page Fault Rate vs. Number of Frames for {label}')
-    plt.xlabel('Number of Frames (log2)')
-    plt.ylabel('Page Fault Rate (log2)')
-    plt.legend()
-    plt.grid(True)
-    plt.savefig(f'plots/fault_rate_vs_frames/fault_rate_vs_frames_{"traces" if traces_dep else "mmu"}_{label}.png')
-    if show:
-        plt.show()
-
-def plot_disk_accesses(subset: pd.DataFrame, label: str, show: bool = False):
-    traces = sorted(subset['trace'].unique())
-    mmus = sorted(set(subset['mmu']))
+def _log(x, base):
+    # Runs without faults after a warm-up, or with every page resident, have
+    # no logarithm; NaN leaves their points out of the plot
+    return math.log(x, base) if x > 0 else math.nan
 
-    traces_dep = None
 
-    if len(traces) == 1:
-        traces_dep = True
-    if len(mmus) == 1:
-        traces_dep = False
+def _traces_dep(subset: pd.DataFrame):
+    # True if the subset is one trace with one line per mode, False if it is
+    # one line per trace
+    return len(subset['trace'].unique()) == 1 and len(set(subset['mmu'])) != 1
 
-    plt.figure(figsize=(10, 6))
-    if traces_dep:
-        for mmu in mmus:
-            subset2 = subset[subset['mmu'] == mmu]
-            print(subset2.to_string())
-            plt.plot(subset2['frames_log'], subset2['disk_accesses_log'], marker='o', label=mmu)
-    else:
-        for trace in traces:
-            subset2 = subset[subset['trace'] == trace]
-            print(subset2.to_string())
-            plt.plot(subset2['frames_log'], subset2['disk_accesses_log'], marker='o', label=trace)
-
-    plt.title(f'Disk Accesses (Reads + Writes) vs. Number of Frames for {label}')
-    plt.xlabel('Number of Frames (log2)')
-    plt.ylabel('Disk Accesses (Reads + Writes) (log10)')
-    plt.legend()
-    plt.grid(True)
-    plt.savefig(f'plots/disk_accesses_vs_frames/disk_accesses_vs_frames_{"traces" if traces_dep else "mmu"}_{label}.png')
-    if show:
-        plt.show()
-
-def plot_thread_time(subset: pd.DataFrame, label: str, show: bool = False):
+def _plot_vs_frames(subset: pd.DataFrame, label: str, kind: str, out_dir: str):
+    (column, title, ylabel) = PLOTS[kind]
     traces = sorted(subset['trace'].unique())
     mmus = sorted(set(subset['mmu']))
+    traces_dep = _traces_dep(subset)
+
+    fig = plt.figure(figsize=(10, 6))
+    try:
+        if traces_dep:
+            for mmu in mmus:
+                subset2 = subset[subset['mmu'] == mmu]
+                plt.plot(subset2['frames_log'], subset2[column], marker='o', label=mmu)
+        else:
+            for trace in traces:
+                subset2 = subset[subset['trace'] == trace]
+                plt.plot(subset2['frames_log'], subset2[column], marker='o', label=trace)
+
+        plt.title(f'{title} vs. Number of Frames for {label}')
+        plt.xlabel('Number of Frames (log2)')
+        plt.ylabel(ylabel)
+        plt.legend()
+        plt.grid(True)
+        path = plot_path(out_dir, kind, traces_dep, label)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fig.savefig(path)
+    finally:
+        # Figures stay alive in pyplot until closed
+        plt.close(fig)
+    return path
+
+def plot_fault_rate(subset: pd.DataFrame, label: str, out_dir: str = "plots"):
+    return _plot_vs_frames(subset, label, "fault_rate_vs_frames", out_dir)
+
+def plot_disk_accesses(subset: pd.DataFrame, label: str, out_dir: str = "plots"):
+    return _plot_vs_frames(subset, label, "disk_accesses_vs_frames", out_dir)
+
+def plot_thread_time(subset: pd.DataFrame, label: str, out_dir: str = "plots"):
+    return _plot_vs_frames(subset, label, "time_vs_frames", out_dir)
+
+PLOT_FUNCTIONS = {
+    "fault_rate_vs_frames": plot_fault_rate,
+    "disk_accesses_vs_frames": plot_disk_accesses,
+    "time_vs_frames": plot_thread_time,
+}
+
+
+def plot_path(out_dir, kind, traces_dep, label):
+    return os.path.join(out_dir, kind, f'{kind}_{"traces" if traces_dep else "mmu"}_{label}.png')
+
+
+def subsets(df):
+    '''Yield (label, subset) for every mode and every trace, per page size.
+    Labels only name the page size when the sweep has more than one.
+    '''
+    page_sizes = sorted(df['page_size'].unique())
+    for page_size in page_sizes:
+        by_size = df[df['page_size'] == page_size]
+        suffix = f"_{page_size}" if len(page_sizes) > 1 else ""
+        for algo in by_size['mmu'].unique():
+            yield f"{algo}{suffix}", by_size[by_size['mmu'] == algo]
+        for trace in sorted(by_size['trace'].unique()):
+            yield f"{trace}{suffix}", by_size[by_size['trace'] == trace]
+
+
+def subset_hash(subset, kind, source_hash):
+    '''Hash of the columns a plot is drawn from, so unrelated columns
+    (such as the time of a fault rate plot) do not cause a redraw.'''
+    columns = ['trace', 'mmu', 'frames_log', PLOTS[kind][0]]
+    digest = hashlib.sha256(source_hash.encode())
+    digest.update(subset[columns].to_csv(index=False).encode())
+    return digest.hexdigest()
+
+
+def plan_plots(df, out_dir, manifest, force=False):
+    '''Returns the (kind, label, subset) to render, and the new manifest,
+    a dict of plot path -> input hash.'''
+    source_hash = hashlib.sha256(inspect.getsource(sys.modules[__name__]).encode()).hexdigest()
+    jobs = []
+    new_manifest = {}
+    for (label, subset) in subsets(df):
+        for kind in PLOTS:
+            path = plot_path(out_dir, kind, _traces_dep(subset), label)
+            digest = subset_hash(subset, kind, source_hash)
+            new_manifest[path] = digest
+            if force or manifest.get(path) != digest or not os.path.exists(path):
+                jobs.append((kind, label, subset))
+    return jobs, new_manifest
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    # Written atomically, so an interrupted run never leaves a broken manifest
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as outfile:
+        json.dump(manifest, outfile, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def render(job, out_dir):
+    (kind, label, subset) = job
+    return PLOT_FUNCTIONS[kind](subset, label, out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plot the results of a sweep, redrawing only the plots whose input changed")
+    parser.add_argument("--input", default="output.csv", help="sweep results to plot (default: output.csv)")
+    parser.add_argument("--out-dir", default="plots", help="directory for the plots (default: plots)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="redraw every plot")
+    args = parser.parse_args()
+
+    try:
+        df = load_results(args.input)
+    except FileNotFoundError:
+        print(f"Input '{args.input}' could not be found")
+        return
+
+    manifest = load_manifest(args.out_dir)
+    (jobs, new_manifest) = plan_plots(df, args.out_dir, manifest, args.force)
+    if args.jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(jobs))) as pool:
+            paths = list(pool.map(render, jobs, [args.out_dir] * len(jobs)))
+    else:
+        paths = [render(job, args.out_dir) for job in jobs]
 
-    traces_dep = None
-
-    if len(traces) == 1:
-        traces_dep = True
-    if len(mmus) == 1:
-        traces_dep = False
+    os.makedirs(args.out_dir, exist_ok=True)
+    save_manifest(args.out_dir, new_manifest)
+    print(f"{len(paths)} plots drawn, {len(new_manifest) - len(paths)} up to date")
 
-    plt.figure(figsize=(10, 6))
-    if traces_dep:
-        for mmu in mmus:
-            subset2 = subset[subset['mmu'] == mmu]
-            print(subset2.to_string())
-            plt.plot(subset2['frames_log'], subset2['time_sec'], marker='o', label=mmu)
-    else:
-        for trace in traces:
-            subset2 = subset[subset['trace'] == trace]
-            print(subset2.to_string())
-            plt.plot(subset2['frames_log'], subset2['time_sec'], marker='o', label=trace)
-
-    plt.title(f'System Cost vs. Number of Frames for {label}')
-    plt.xlabel('Number of Frames (log2)')
-    plt.ylabel('Time (sec)')
-    plt.legend()
-    plt.grid(True)
-    plt.savefig(f'plots/time_vs_frames/time_vs_frames_{"traces" if traces_dep else "mmu"}_{label}.png')
-    if show:
-        plt.show()
-
-for algo in df['mmu'].unique():
-    subset = df[df['mmu'] == algo]
-    plot_fault_rate(subset, label=algo)
-    plot_thread_time(subset, label=algo)
-
-for trace in sorted(df['trace'].unique()):
-    subset = df[df['trace'] == trace]
-    plot_fault_rate(subset, label=trace)
-    plot_thread_time(subset, label=trace)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+'''
+* Deterministic synthetic traces in the memsim.py format.
+* Every generator takes the number of events, the number of distinct pages
+* it works over, the fraction of writes and a seed, and yields
+* (address, is_write) pairs; the same arguments always give the same trace.
+*
+*   sequential  one scan through the pages in order, with a run of
+*               accesses to each page; a page is never used again once the
+*               scan has left it
+*   loop        cycles through the same pages in order
+*   zipf        pages drawn with Zipf popularity, a small hot set
+*   phase       uniform accesses to a working set that moves every
+*               phase_length events
+*
+* With --processes N the trace interleaves N processes running the same
+* workload with different seeds, in slices of QUANTUM events, and has the
+* PID column of processtrace.py.
+*
+* Usage: python workloads.py workload events outfile [--pages N] [--write-ratio R] [--seed S]
+*                                                    [--processes N]
+'''
+import argparse
+import random
+from itertools import accumulate
+
+PAGE_SIZE = 4096
+ADDRESS_PAGES = 1 << 20  # 32-bit addresses, the 8 hex digits of a trace line
+ZIPF_EXPONENT = 1.0
+PHASE_LENGTH = 10_000  # events per phase of the phase workload
+QUANTUM = 100  # events a process runs before the next one is picked
+VERSION = 2  # Bump when a generator yields a different trace for the same arguments
+
+
+def _address(rng, page_number):
+    # Any offset within the page, so the offset bits are not always zero
+    return (page_number % ADDRESS_PAGES) * PAGE_SIZE + rng.randrange(PAGE_SIZE)
+
+
+def _is_writes(rng, events, write_ratio):
+    return (rng.random() < write_ratio for _ in range(events))
+
+
+def sequential(events, pages, write_ratio, seed=0):
+    '''Pages 0..pages-1 in order, each for events/pages consecutive accesses.'''
+    rng = random.Random(seed)
+    for (index, write) in enumerate(_is_writes(random.Random(seed + 1), events, write_ratio)):
+        yield _address(rng, index * pages // events), write
+
+
+def loop(events, pages, write_ratio, seed=0):
+    rng = random.Random(seed)
+    for (index, write) in enumerate(_is_writes(random.Random(seed + 1), events, write_ratio)):
+        yield _address(rng, index % pages), write
+
+
+def zipf(events, pages, write_ratio, seed=0, exponent=ZIPF_EXPONENT):
+    rng = random.Random(seed)
+    # Page k has weight 1/(k+1)^exponent; shuffle so hot pages are not adjacent
+    cum_weights = list(accumulate(1 / (rank + 1) ** exponent for rank in range(pages)))
+    page_numbers = list(range(pages))
+    rng.shuffle(page_numbers)
+    ranks = rng.choices(range(pages), cum_weights=cum_weights, k=events)
+    for (rank, write) in zip(ranks, _is_writes(random.Random(seed + 1), events, write_ratio)):
+        yield _address(rng, page_numbers[rank]), write
+
+
+def phase(events, pages, write_ratio, seed=0, phase_length=PHASE_LENGTH):
+    rng = random.Random(seed)
+    base = 0
+    for (index, write) in enumerate(_is_writes(random.Random(seed + 1), events, write_ratio)):
+        if index and index % phase_length == 0:
+            # Move to a working set that half overlaps the previous one
+            base += pages // 2 or 1
+        yield _address(rng, base + rng.randrange(pages)), write
+
+
+WORKLOADS = {
+    "sequential": sequential,
+    "loop": loop,
+    "zipf": zipf,
+    "phase": phase,
+}
+
+
+def write_trace(path, workload, events, pages, write_ratio=0.3, seed=0):
+    '''Write a generated trace to path in the memsim.py format.'''
+    generator = WORKLOADS[workload]
+    with open(path, 'w') as outfile:
+        outfile.writelines(f"{address:08x} {'W' if write else 'R'}\n"
+                           for (address, write) in generator(events, pages, write_ratio, seed))
+
+
+def processes_trace(workload, events, pages, write_ratio, processes, seed=0):
+    '''Yield (address, is_write, pid): processes running workload with seeds
+    seed + pid, sharing the events, interleaved in random slices of QUANTUM.
+    '''
+    rng = random.Random(seed)
+    generator = WORKLOADS[workload]
+    running = {pid: generator(events // processes + (pid < events % processes), pages, write_ratio, seed + pid)
+               for pid in range(processes)}
+    while running:
+        pid = rng.choice(list(running))
+        for _ in range(QUANTUM):
+            access = next(running[pid], None)
+            if access is None:
+                del running[pid]
+                break
+            yield access + (pid,)
+
+
+def write_process_trace(path, workload, events, pages, write_ratio=0.3, processes=1, seed=0):
+    '''Write a generated trace of several processes to path in the processtrace.py format.'''
+    with open(path, 'w') as outfile:
+        outfile.writelines(f"{address:08x} {'W' if write else 'R'} {pid}\n"
+                           for (address, write, pid) in processes_trace(workload, events, pages, write_ratio,
+                                                                         processes, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic trace in the memsim.py format")
+    parser.add_argument("workload", choices=list(WORKLOADS))
+    parser.add_argument("events", type=int)
+    parser.add_argument("outfile")
+    parser.add_argument("--pages", type=int, default=1024, help="distinct pages worked over (default: 1024)")
+    parser.add_argument("--write-ratio", type=float, default=0.3, help="fraction of writes (default: 0.3)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=0,
+                        help="interleave this many processes and add a PID column (default: 0, no column)")
+    args = parser.parse_args()
+    if args.processes > 0:
+        write_process_trace(args.outfile, args.workload, args.events, args.pages, args.write_ratio,
+                            args.processes, args.seed)
+    else:
+        write_trace(args.outfile, args.workload, args.events, args.pages, args.write_ratio, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+'''
+* Background write-back of dirty pages and a simple disk latency model.
+* Without a page cleaner, a dirty victim is written back when it is evicted,
+* and the fault that evicted it waits for the write before its read.
+* PageCleaner wraps an MMU and, like Linux's flusher threads, writes dirty
+* pages back ahead of eviction: when more than high_watermark of the frames
+* hold dirty pages, the oldest dirtied ones are written back (and their
+* modified bits cleared with MMU.clean_frame()) until at most low_watermark
+* of the frames are dirty. These writes do not stall the program, but they
+* take their turn on the disk. The high watermark is at least one page, so
+* with few frames a store is not written back at once.
+*
+* DiskModel serves requests on queue_depth channels, each busy for the
+* read or write latency of its request. Time advances by access_time per
+* event and by every stall: a fault waits for its eviction write-back, if
+* any, and for its read, including any queueing behind earlier requests.
+*
+* The cleaner follows the MMU through its tracer interface (see
+* eventtrace.py), so it works with every replacement policy.
+*
+* Usage: python writeback.py tracefile frames mode [--high F] [--low F]
+*                            [--read-latency S] [--write-latency S]
+*                            [--queue-depth N] [--access-time S]
+'''
+import argparse
+import heapq
+from collections import OrderedDict
+
+from eventtrace import HIT, FAULT, EVICT, WRITEBACK
+
+DEFAULT_READ_LATENCY = 100e-6  # seconds per page read
+DEFAULT_WRITE_LATENCY = 250e-6  # seconds per page write
+DEFAULT_QUEUE_DEPTH = 4  # requests the disk serves at once
+DEFAULT_ACCESS_TIME = 100e-9  # seconds per memory access that does not fault
+DEFAULT_HIGH_WATERMARK = 0.2  # dirty fraction of the frames that starts the cleaner
+DEFAULT_LOW_WATERMARK = 0.1  # dirty fraction the cleaner brings it down to
+
+
+class DiskModel:
+    def __init__(self, read_latency=DEFAULT_READ_LATENCY, write_latency=DEFAULT_WRITE_LATENCY,
+                 queue_depth=DEFAULT_QUEUE_DEPTH):
+        if queue_depth < 1:
+            raise ValueError("Queue depth must be at least 1")
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.free_at = [0.0] * queue_depth  # Min-heap of the times each channel is free
+
+    def _submit(self, now, latency):
+        start = max(now, heapq.heappop(self.free_at))
+        finish = start + latency
+        heapq.heappush(self.free_at, finish)
+        return finish
+
+    def read(self, now):
+        '''Time at which a read submitted at now completes.'''
+        return self._submit(now, self.read_latency)
+
+    def write(self, now):
+        '''Time at which a write submitted at now completes.'''
+        return self._submit(now, self.write_latency)
+
+
+class PageCleaner:
+    '''Runs an MMU with a page cleaner and a disk model; has the MMU counters,
+    with disk writes including the cleaner's, and adds the timing ones.'''
+
+    def __init__(self, mmu, frames, disk=None, high_watermark=DEFAULT_HIGH_WATERMARK,
+                 low_watermark=DEFAULT_LOW_WATERMARK, access_time=DEFAULT_ACCESS_TIME):
+        if not 0 <= low_watermark <= high_watermark:
+            raise ValueError("Watermarks must satisfy 0 <= low <= high")
+        self.mmu = mmu
+        self.disk = disk if disk is not None else DiskModel()
+        # The cleaner starts above high_pages dirty pages and stops at low_pages. At
+        # least one page may stay dirty, or small memories would clean every store
+        self.high_pages = max(1, int(high_watermark * frames))
+        self.low_pages = min(int(low_watermark * frames), self.high_pages)
+        self.access_time = access_time
+        self.dirty = OrderedDict()  # Frames holding a dirty page, oldest dirtied first
+        self.writing = False  # True while a write access goes through the MMU
+        self.now = 0.0  # Simulated seconds since the start
+        self.stall_time = 0.0  # Seconds spent waiting for the disk
+        self.background_writes = 0
+        self.eviction_writes = 0
+        mmu.set_tracer(self)
+
+    def record(self, kind, page_number, frame_index):
+        # Tracer interface: follow the dirty frames and time the disk requests
+        if kind == HIT:
+            if self.writing and frame_index not in self.dirty:
+                self.dirty[frame_index] = None
+        elif kind == EVICT:
+            self.dirty.pop(frame_index, None)
+        elif kind == WRITEBACK:
+            # The fault waits for the write-back of its victim
+            self.eviction_writes += 1
+            self._wait(self.disk.write(self.now))
+        elif kind == FAULT:
+            self._wait(self.disk.read(self.now))
+            if self.writing:
+                self.dirty[frame_index] = None
+
+    def _wait(self, finish):
+        self.stall_time += finish - self.now
+        self.now = finish
+
+    def access(self, page_number, write):
+        self.writing = write
+        if write:
+            self.mmu.write_memory(page_number)
+        else:
+            self.mmu.read_memory(page_number)
+        self.now += self.access_time
+
+        if len(self.dirty) > self.high_pages:
+            # Write back the oldest dirty pages in the background
+            while len(self.dirty) > self.low_pages:
+                (frame_index, _) = self.dirty.popitem(last=False)
+                self.mmu.clean_frame(frame_index)
+                self.disk.write(self.now)
+                self.background_writes += 1
+
+    def access_batch(self, pages, is_write):
+        access = self.access
+        for page_number, write in zip(pages, is_write):
+            access(page_number, write)
+
+    def get_total_disk_reads(self):
+        return self.mmu.get_total_disk_reads()
+
+    def get_total_disk_writes(self):
+        # Write-backs at eviction, which the MMU counts, and the cleaner's
+        return self.mmu.get_total_disk_writes() + self.background_writes
+
+    def get_total_page_faults(self):
+        return self.mmu.get_total_page_faults()
+
+    def get_background_writes(self):
+        return self.background_writes
+
+    def get_eviction_writes(self):
+        return self.eviction_writes
+
+    def get_stall_time(self):
+        return self.stall_time
+
+    def get_elapsed_time(self):
+        return self.now
+
+
+def main():
+    from evaluate import ReplacementMMU, create_mmu
+    from optmmu import OptMMU, next_use_index
+    from tracefile import PAGE_OFFSET, TraceStream, TraceFormatError, open_trace
+
+    modes = {x.name: x for x in ReplacementMMU}
+    modes["2q"] = modes.pop("twoq")
+    parser = argparse.ArgumentParser(description="Simulate one run with a page cleaner and report the disk stall time")
+    parser.add_argument("tracefile")
+    parser.add_argument("frames", type=int)
+    parser.add_argument("mode", choices=list(modes))
+    parser.add_argument("--high", type=float, default=DEFAULT_HIGH_WATERMARK,
+                        help=f"dirty fraction of the frames that starts the cleaner (default: {DEFAULT_HIGH_WATERMARK})")
+    parser.add_argument("--low", type=float, default=DEFAULT_LOW_WATERMARK,
+                        help=f"dirty fraction the cleaner stops at (default: {DEFAULT_LOW_WATERMARK})")
+    parser.add_argument("--read-latency", type=float, default=DEFAULT_READ_LATENCY,
+                        help=f"seconds per page read (default: {DEFAULT_READ_LATENCY})")
+    parser.add_argument("--write-latency", type=float, default=DEFAULT_WRITE_LATENCY,
+                        help=f"seconds per page write (default: {DEFAULT_WRITE_LATENCY})")
+    parser.add_argument("--queue-depth", type=int, default=DEFAULT_QUEUE_DEPTH,
+                        help=f"requests the disk serves at once (default: {DEFAULT_QUEUE_DEPTH})")
+    parser.add_argument("--access-time", type=float, default=DEFAULT_ACCESS_TIME,
+                        help=f"seconds per access that does not fault (default: {DEFAULT_ACCESS_TIME})")
+    args = parser.parse_args()
+
+    if args.frames < 1:
+        print("Frame number must be at least 1")
+        return
+
+    try:
+        trace = open_trace(args.tracefile, PAGE_OFFSET)
+    except FileNotFoundError:
+        print(f"Input '{args.tracefile}' could not be found")
+        return
+    except (OSError, EOFError):
+        print(f"Input '{args.tracefile}' could not be read")
+        return
+    except TraceFormatError as err:
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
+
+    mode = modes[args.mode]
+    if mode is ReplacementMMU.opt:
+        # OPT looks ahead, so it needs the whole trace up front
+        if isinstance(trace, TraceStream):
+            print("Replacement mode opt cannot be used with a compressed or stdin trace")
+            return
+        mmu = OptMMU(args.frames, next_use_index(trace.pages))
+    else:
+        mmu = create_mmu(mode, args.frames, args.tracefile)
+
+    try:
+        disk = DiskModel(args.read_latency, args.write_latency, args.queue_depth)
+        cleaner = PageCleaner(mmu, args.frames, disk, args.high, args.low, args.access_time)
+    except ValueError as err:
+        print(err)
+        return
+
+    try:
+        for pages, writes in trace.chunks():
+            cleaner.access_batch(pages, writes)
+    except TraceFormatError as err:
+        # Only streamed traces are parsed while simulating
+        print(f"Badly formatted file. Error on line {err.line_number}")
+        return
+
+    no_events = len(trace)
+    print(f"total memory frames: {args.frames}")
+    print(f"events in trace: {no_events}")
+    print(f"total disk reads: {cleaner.get_total_disk_reads()}")
+    print(f"total disk writes: {cleaner.get_total_disk_writes()}")
+    print("page fault rate: {0:.4f}".format(cleaner.get_total_page_faults() / no_events))
+    print(f"background writes: {cleaner.get_background_writes()}")
+    print(f"eviction writes: {cleaner.get_eviction_writes()}")
+    print(f"stall time: {cleaner.get_stall_time():.6f}s")
+    print(f"elapsed time: {cleaner.get_elapsed_time():.6f}s")
+
+if __name__ == "__main__":
+    main()